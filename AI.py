@@ -38,11 +38,19 @@ def initialize_keys():
         public_key = serialization.load_pem_public_key(f.read(), backend=default_backend())
     return private_key, public_key
 
-PRIVATE_KEY, PUBLIC_KEY = initialize_keys()
+# Keys are loaded (or generated) on first use, not on import
+_keys = None
+
+def get_keys():
+    global _keys
+    if _keys is None:
+        _keys = initialize_keys()
+    return _keys
 
 def sign_game_data(data):
     data_str = json.dumps(data, sort_keys=True)
-    signature = PRIVATE_KEY.sign(
+    private_key, _ = get_keys()
+    signature = private_key.sign(
         data_str.encode(),
         padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
         hashes.SHA256()
@@ -52,7 +60,8 @@ def sign_game_data(data):
 def verify_game_data(data, signature_hex):
     try:
         data_str = json.dumps(data, sort_keys=True)
-        PUBLIC_KEY.verify(
+        _, public_key = get_keys()
+        public_key.verify(
             bytes.fromhex(signature_hex),
             data_str.encode(),
             padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
@@ -0,0 +1,94 @@
+import logging
+
+import numpy as np
+
+import solved_table
+
+logger = logging.getLogger(__name__)
+
+# Пакетная обработка досок 3x3: массив (N, 9) с кодами клеток 0 - пусто, 1 - X, 2 - O
+# (те же цифры, что и в solved_table). Оценка совпадает с evaluate_board:
+# +1 - победа O, -1 - победа X, 0 - ничья, ONGOING - игра не закончена.
+EMPTY, X, O = 0, 1, 2
+ONGOING = 2
+NO_MOVE = -1
+
+CELL_CODES = {" ": EMPTY, "X": X, "O": O}
+LINES = np.array(solved_table.WIN_LINES, dtype=np.intp)
+POWERS = np.array(solved_table.POWERS, dtype=np.int32)
+
+_dense = None
+
+
+def to_array(boards) -> np.ndarray:
+    # Списки из " "/"X"/"O" (как в боте) -> массив (N, 9)
+    return np.array([[CELL_CODES[cell] for cell in board] for board in boards], dtype=np.int8).reshape(-1, 9)
+
+
+def _player_codes(players, count: int) -> np.ndarray:
+    if isinstance(players, str):
+        return np.full(count, CELL_CODES[players], dtype=np.int8)
+    players = np.asarray(players)
+    if players.dtype.kind in "UO":
+        players = np.array([CELL_CODES[p] for p in players], dtype=np.int8)
+    return players.astype(np.int8).reshape(count)
+
+
+def winners(boards: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    lines = boards[:, LINES]
+    x_wins = (lines == X).all(axis=2).any(axis=1)
+    o_wins = (lines == O).all(axis=2).any(axis=1)
+    return x_wins, o_wins
+
+
+def evaluate_boards(boards) -> np.ndarray:
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 9)
+    x_wins, o_wins = winners(boards)
+    full = (boards != EMPTY).all(axis=1)
+    scores = np.full(len(boards), ONGOING, dtype=np.int8)
+    scores[full] = 0
+    scores[x_wins] = -1
+    scores[o_wins] = 1
+    return scores
+
+
+def _dense_tables() -> tuple[np.ndarray, np.ndarray]:
+    # Решённая таблица в виде плоских массивов, индекс - номер позиции в троичной системе
+    global _dense
+    if _dense is None:
+        # Записи файла уже лежат по номеру позиции: разбираем их одной векторной операцией
+        records = np.frombuffer(solved_table.load_table().records, dtype=np.uint32)
+        low = records & 0xFF
+        values = np.where(low == solved_table.MISSING, 0, low.astype(np.int16) - 1).astype(np.int8)
+        distances = (records >> 8 & 0xFF).astype(np.int8)
+        _dense = values, distances
+    return _dense
+
+
+def best_moves(boards, players) -> np.ndarray:
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 9)
+    movers = _player_codes(players, len(boards))
+    values, distances = _dense_tables()
+
+    # Партии, начатые O, сводим к партиям X заменой символов (как solved_table.position_code)
+    x_count = (boards == X).sum(axis=1)
+    o_count = (boards == O).sum(axis=1)
+    standard = ((movers == X) & (x_count == o_count)) | ((movers == O) & (x_count == o_count + 1))
+    swapped = ((movers == O) & (o_count == x_count)) | ((movers == X) & (o_count == x_count + 1))
+    normalized = np.where(swapped[:, None] & (boards != EMPTY), 3 - boards, boards)
+    normalized_movers = np.where(swapped, 3 - movers, movers).astype(np.int32)
+
+    codes = normalized.astype(np.int32) @ POWERS
+    child_codes = codes[:, None] + normalized_movers[:, None] * POWERS[None, :]
+    empty = boards == EMPTY
+    child_codes = np.where(empty, child_codes, 0)
+
+    # Ценность хода для ходящего: быстрее выигрывать, дольше проигрывать
+    move_values = -values[child_codes].astype(np.int32)
+    move_distances = distances[child_codes].astype(np.int32) + 1
+    keys = move_values * 64 + np.where(move_values > 0, -move_distances, move_distances)
+    keys = np.where(empty, keys, np.iinfo(np.int32).min)
+
+    moves = keys.argmax(axis=1)
+    playable = (standard | swapped) & empty.any(axis=1) & (evaluate_boards(boards) == ONGOING)
+    return np.where(playable, moves, NO_MOVE)
@@ -0,0 +1,63 @@
+import time
+import random
+import logging
+import argparse
+
+import numpy as np
+
+import common  # добавляет корень репозитория в sys.path
+import engine
+import solved_table
+import batch_engine
+
+
+def sample_positions(count: int, seed: int) -> tuple[list, list]:
+    # Случайные незавершённые позиции из решённой таблицы, X ходит первым
+    rng = random.Random(seed)
+    codes = [code for code, solution in solved_table.load_table().items() if solution.moves]
+    boards, players = [], []
+    for code in rng.choices(codes, k=count):
+        board = solved_table.decode_board(code)
+        boards.append(board)
+        players.append("X" if board.count("X") == board.count("O") else "O")
+    return boards, players
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched best moves vs ai_move in a loop")
+    parser.add_argument("--count", type=int, default=200_000)
+    parser.add_argument("--loop-count", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    boards, players = sample_positions(args.count, args.seed)
+    array = batch_engine.to_array(boards)
+    player_codes = np.array([batch_engine.CELL_CODES[p] for p in players], dtype=np.int8)
+    batch_engine.best_moves(array[:1], player_codes[:1])  # прогрев таблиц
+
+    start = time.perf_counter()
+    moves = batch_engine.best_moves(array, player_codes)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = batch_engine.evaluate_boards(array)
+    eval_time = time.perf_counter() - start
+
+    loop_boards = boards[:args.loop_count]
+    start = time.perf_counter()
+    for board, player in zip(loop_boards, players):
+        engine.ai_move(list(board), player, "hard")
+    loop_time = time.perf_counter() - start
+
+    optimal = sum(int(m) in solved_table.lookup(b, p).moves for b, p, m in zip(boards, players, moves))
+    assert np.array_equal(scores, [batch_engine.ONGOING] * len(boards))
+    print(f"batch best_moves:    {len(boards) / batch_time:>12,.0f} positions/s ({len(boards)} boards)")
+    print(f"batch evaluate:      {len(boards) / eval_time:>12,.0f} positions/s")
+    print(f"ai_move('hard') loop:{len(loop_boards) / loop_time:>12,.0f} positions/s ({len(loop_boards)} boards)")
+    print(f"optimal moves: {optimal}/{len(boards)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import logging
+import argparse
+
+from common import count_nodes, measure
+import engine
+import bitboard
+import transposition
+
+# Позиции для сравнения: пустая доска и пара типичных миттельшпилей
+POSITIONS = {
+    "empty": [" "] * 9,
+    "after_1": ["X", " ", " ", " ", " ", " ", " ", " ", " "],
+    "midgame": ["X", " ", " ", " ", "O", " ", " ", " ", "X"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List vs bitboard minimax: nodes/second")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'position':<10} {'core':<9} {'nodes':>8} {'seconds':>9} {'nodes/s':>12}")
+    for name, board in POSITIONS.items():
+        player = "O" if board.count("X") > board.count("O") else "X"
+        opponent = "O" if player == "X" else "X"
+        x_bits, o_bits = bitboard.to_bitboards(board)
+
+        list_args = (list(board), 0, True, player, opponent)
+        bits_args = (x_bits, o_bits, 0, True, player)
+        list_nodes = count_nodes(engine, "minimax", *list_args)
+        bits_nodes = count_nodes(bitboard, "minimax", *bits_args)
+        list_time = measure(engine.minimax, *list_args, repeat=args.repeat)
+        bits_time = measure(bitboard.minimax, *bits_args, repeat=args.repeat)
+        assert engine.minimax(*list_args) == bitboard.minimax(*bits_args)
+
+        print(f"{name:<10} {'list':<9} {list_nodes:>8} {list_time:>9.4f} {list_nodes / list_time:>12,.0f}")
+        print(f"{name:<10} {'bitboard':<9} {bits_nodes:>8} {bits_time:>9.4f} {bits_nodes / bits_time:>12,.0f}")
+        print(f"{'':<10} speedup x{list_time / bits_time:.1f}")
+
+        # Таблица транспозиций: холодная (пустая перед поиском) и прогретая предыдущим поиском
+        table = transposition.TranspositionTable()
+        tt_nodes = count_nodes(transposition, "minimax", *bits_args, -float("inf"), float("inf"), table)
+        cold_time = measure(lambda: transposition.minimax(*bits_args, table=transposition.TranspositionTable()),
+                            repeat=args.repeat)
+        warm_time = measure(lambda: transposition.minimax(*bits_args, table=table), repeat=args.repeat)
+        print(f"{name:<10} {'tt cold':<9} {tt_nodes:>8} {cold_time:>9.4f} {tt_nodes / cold_time:>12,.0f}")
+        print(f"{name:<10} {'tt warm':<9} {'':>8} {warm_time:>9.4f}   {table.stats()['hit_rate']:.0%} hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import random
+import logging
+import argparse
+import tracemalloc
+
+import common  # добавляет корень репозитория в sys.path
+import nxn_engine
+import mcts
+
+
+def reachable_nodes(engine: mcts.MCTS) -> int:
+    # Узлы, которые держит индекс: поднимаемся по parent до корня и считаем всё дерево под ним
+    tops = {}
+    for node, _ in engine.index.values():
+        while node.parent is not None:
+            node = node.parent
+        tops[id(node)] = node
+    seen = set()
+    stack = list(tops.values())
+    while stack:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            stack.extend(node.children.values())
+    return len(seen)
+
+
+def play(size: int, playouts: int, moves: int, seed: int):
+    # Одна партия ИИ против себя: после каждого хода индекс должен держать ровно index_nodes узлов
+    engine = mcts.MCTS(rng=random.Random(seed))
+    board = [" "] * (size * size)
+    player = "X"
+    print(f"{'move':>5}{'index nodes':>13}{'reachable':>11}{'MB':>8}{'reused':>8}")
+    tracemalloc.start()
+    for ply in range(moves):
+        state = mcts.NxNState.from_board(board, player)
+        if state.is_terminal():
+            break
+        move = engine.search(state, playouts=playouts)
+        board[move] = player
+        player = "O" if player == "X" else "X"
+        reachable = reachable_nodes(engine)
+        memory = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        print(f"{ply + 1:>5}{engine.index_nodes:>13,}{reachable:>11,}{memory:>8.1f}{engine.reused:>8}")
+        assert reachable == engine.index_nodes, (reachable, engine.index_nodes)
+        assert engine.index_nodes <= engine.node_budget
+    tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCTS subtree index: nodes kept between searches vs the node budget")
+    parser.add_argument("--size", type=int, default=7, choices=sorted(nxn_engine.WIN_LENGTH))
+    parser.add_argument("--playouts", type=int, default=3000)
+    parser.add_argument("--moves", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    play(args.size, args.playouts, args.moves, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import time
+import random
+import argparse
+import statistics
+
+from common import measure
+import qubic
+
+
+def play_game(difficulty: str, seed: int) -> list:
+    # Движок против самого себя; возвращает время каждого хода
+    random.seed(seed)
+    board = qubic.create_board()
+    player = "X"
+    latencies = []
+    # Пара случайных первых ходов, чтобы партии различались
+    for _ in range(2):
+        move = random.choice([i for i, cell in enumerate(board) if cell == " "])
+        board[move] = player
+        player = "O" if player == "X" else "X"
+    while True:
+        start = time.perf_counter()
+        move = qubic.ai_move(board, player, difficulty)
+        latencies.append(time.perf_counter() - start)
+        if move is None:
+            return latencies
+        board[move] = player
+        if qubic.check_winner(board, player):
+            return latencies
+        player = "O" if player == "X" else "X"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qubic (4x4x4) per-move latency")
+    parser.add_argument("--games", type=int, default=3)
+    parser.add_argument("--difficulties", nargs="+", default=["easy", "medium", "hard"])
+    args = parser.parse_args()
+
+    x_bits, o_bits = 0x0000_0000_0000_0F0F, 0x0000_F0F0_0000_0000
+    print(f"is_win:  {measure(qubic.is_win, x_bits, repeat=5, number=10_000) * 1e6:.2f} us")
+    print(f"threats: {measure(qubic.threats, x_bits, o_bits, repeat=5, number=10_000) * 1e6:.2f} us")
+
+    print(f"{'difficulty':<10} {'moves':>6} {'p50, s':>8} {'p95, s':>8} {'max, s':>8}")
+    for difficulty in args.difficulties:
+        latencies = []
+        for game in range(args.games):
+            latencies += play_game(difficulty, game)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{difficulty:<10} {len(latencies):>6} {statistics.median(latencies):>8.3f} {p95:>8.3f} {latencies[-1]:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
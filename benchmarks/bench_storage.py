@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import asyncio
+import random
+import sqlite3
+import logging
+import argparse
+import tempfile
+
+from common import REPO_DIR, measure
+from storage import SAVE_STATE_SQL, Storage, WriteBehind, decode_board, encode_board, state_row
+
+SCHEMA_FILE = os.path.join(REPO_DIR, "database.sql")
+
+
+USER_DATA = {"game_mode": "player_vs_ai", "difficulty": "hard", "human_player": "X", "ai_player": "O"}
+
+
+def random_board(cells: int, rng: random.Random) -> list:
+    return [rng.choice(" XO") for _ in range(cells)]
+
+
+def make_row(user_id: int, rng: random.Random) -> tuple:
+    board = random_board(9, rng)
+    return state_row(user_id, board, 9 - board.count(" "), USER_DATA)
+
+
+def legacy_row(board: list) -> tuple:
+    # Прежний формат: JSON-доска и текстовые колонки
+    return (json.dumps(board), len(board), "player_vs_ai", "hard", "X", "O", None, None, None, None)
+
+
+def legacy_decode(text: str) -> list:
+    board = json.loads(text)
+    if not all(c in [" ", "X", "O"] for c in board):
+        raise ValueError(text)
+    return board
+
+
+def encoding_report(seed: int):
+    # Размер значений строки (без служебных байтов SQLite) и стоимость кодирования/разбора доски
+    rng = random.Random(seed)
+    print(f"{'cells':>8}  {'format':<10}{'row bytes':>10}{'encode us':>11}{'decode us':>11}")
+    for cells in (9, 16, 25, 49, 64):
+        board = random_board(cells, rng)
+        legacy = legacy_row(board)
+        compact = state_row(1, board, cells, USER_DATA)[1:]
+        formats = {
+            "json": (legacy, lambda: json.dumps(board), legacy_decode, legacy[0]),
+            "compact": (compact, lambda: encode_board(board), decode_board, compact[0]),
+        }
+        for name, (row, encode, decode, stored) in formats.items():
+            size = sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row if value is not None)
+            print(f"{cells:>8}  {name:<10}{size:>10}{measure(encode, number=10_000) * 1e6:>11.2f}"
+                  f"{measure(decode, stored, number=10_000) * 1e6:>11.2f}")
+
+
+def connect_per_write(path: str, rows: list) -> float:
+    # Прежняя схема: новое соединение, журнал по умолчанию и fsync на каждый ход
+    started = time.perf_counter()
+    for row in rows:
+        conn = sqlite3.connect(path, timeout=5.0)
+        conn.execute(SAVE_STATE_SQL, row)
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - started
+
+
+def persistent(path: str, rows: list) -> float:
+    storage = Storage(path)
+    try:
+        started = time.perf_counter()
+        for row in rows:
+            storage.save_state(row)
+        return time.perf_counter() - started
+    finally:
+        storage.close()
+
+
+def write_behind(path: str, rows: list) -> float:
+    # Время до полного сброса очереди в базу, а не только постановки в очередь
+    async def run() -> float:
+        writer = WriteBehind(storage)
+        started = time.perf_counter()
+        writer.start()
+        for i, row in enumerate(rows):
+            writer.save(row[0], row)
+            if i % 32 == 0:
+                await asyncio.sleep(0)  # обработчики бота отдают управление между сообщениями
+        await writer.stop()
+        return time.perf_counter() - started
+
+    storage = Storage(path)
+    try:
+        return asyncio.run(run())
+    finally:
+        storage.close()
+
+
+MODES = {
+    "connect-per-write": connect_per_write,
+    "persistent+wal": persistent,
+    "write-behind": write_behind,
+}
+
+
+def run(mode: str, games: int, writes: int, seed: int) -> float:
+    # games активных партий: записи идут ходами по случайным пользователям, таблица держит games строк
+    rng = random.Random(seed)
+    rows = [make_row(rng.randrange(games), rng) for _ in range(writes)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "game.db")
+        setup = Storage(path)
+        setup.init_schema(SCHEMA_FILE)
+        for user_id in range(games):
+            setup.save_state(make_row(user_id, rng))
+        setup.close()
+        if mode == "connect-per-write":
+            # Прежняя база открывалась в режиме журнала по умолчанию
+            with sqlite3.connect(path) as conn:
+                conn.execute("PRAGMA journal_mode=DELETE")
+        return writes / MODES[mode](path, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Board-state writes per second: connection per write vs persistent WAL connection vs write-behind queue")
+    parser.add_argument("--games", type=int, nargs="*", default=[1_000, 10_000], help="active games (rows in game_state)")
+    parser.add_argument("--writes", type=int, default=2_000, help="writes per measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    encoding_report(args.seed)
+    print()
+    print(f"{'games':>8}  {'mode':<24}{'writes/s':>12}")
+    for games in args.games:
+        rates = {}
+        for mode in MODES:
+            rates[mode] = run(mode, games, args.writes, args.seed)
+            print(f"{games:>8}  {mode:<24}{rates[mode]:>12,.0f}")
+        for mode in list(MODES)[1:]:
+            print(f"{games:>8}  {'speedup ' + mode:<24}{rates[mode] / rates['connect-per-write']:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
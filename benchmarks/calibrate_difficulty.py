@@ -0,0 +1,65 @@
+import random
+import logging
+import argparse
+
+import common  # добавляет корень репозитория в sys.path
+import engine
+import solved_table
+
+
+def play(difficulty: str, tier_symbol: str, rng: random.Random) -> str:
+    # Партия уровня сложности против идеальной игры; X всегда ходит первым
+    board = [" "] * 9
+    player = "X"
+    for _ in range(9):
+        if player == tier_symbol:
+            move = engine.ai_move(board, player, difficulty, rng)
+        else:
+            move = solved_table.sample_move(solved_table.move_values(board, player), 0, rng)
+        board[move] = player
+        if engine.check_winner(board, player):
+            return "win" if player == tier_symbol else "loss"
+        player = "O" if player == "X" else "X"
+    return "draw"
+
+
+def calibrate(difficulty: str, games: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    results = {}
+    for symbol in ("X", "O"):
+        counts = {"win": 0, "draw": 0, "loss": 0}
+        for _ in range(games):
+            counts[play(difficulty, symbol, rng)] += 1
+        results[symbol] = counts
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Win/draw/loss rate of each 3x3 difficulty against perfect play")
+    parser.add_argument("--games", type=int, default=2_000, help="games per tier and side")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--temperatures", type=float, nargs="*", default=[],
+                        help="extra temperatures to try besides the configured tiers")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    tiers = dict(solved_table.DIFFICULTY_TEMPERATURE)
+    for temperature in args.temperatures:
+        tiers[f"T={temperature:g}"] = temperature
+    original = dict(solved_table.DIFFICULTY_TEMPERATURE)
+    solved_table.DIFFICULTY_TEMPERATURE.update(tiers)
+
+    print(f"{'tier':<10}{'T':>6}  {'side':<5}{'win':>8}{'draw':>8}{'loss':>8}")
+    try:
+        for name, temperature in tiers.items():
+            for symbol, counts in calibrate(name, args.games, args.seed).items():
+                rates = [counts[key] / args.games for key in ("win", "draw", "loss")]
+                print(f"{name:<10}{temperature:>6g}  {symbol:<5}" + "".join(f"{rate:>8.1%}" for rate in rates))
+    finally:
+        solved_table.DIFFICULTY_TEMPERATURE.clear()
+        solved_table.DIFFICULTY_TEMPERATURE.update(original)
+
+
+if __name__ == "__main__":
+    main()
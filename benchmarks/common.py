@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import importlib.util
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_FILE = os.path.join(REPO_DIR, "Крестики-нолики v4.0 .py")
+
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+_bot = None
+
+
+def load_bot_module():
+    # Файл бота не импортируется обычным import из-за пробела и кириллицы в имени
+    global _bot
+    if _bot is None:
+        spec = importlib.util.spec_from_file_location("tictactoe_bot", BOT_FILE)
+        _bot = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_bot)
+    return _bot
+
+
+def count_nodes(module, name, *args):
+    # Подменяем функцию счётчиком на время одного поиска; рекурсивные вызовы идут через глобальное имя
+    original = getattr(module, name)
+    nodes = 0
+
+    def counting(*a, **kw):
+        nonlocal nodes
+        nodes += 1
+        return original(*a, **kw)
+
+    setattr(module, name, counting)
+    try:
+        counting(*args)
+    finally:
+        setattr(module, name, original)
+    return nodes
+
+
+def measure(func, *args, repeat: int = 5, number: int = 1) -> float:
+    # Лучшее время одного вызова из нескольких повторов, в секундах
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from types import SimpleNamespace
+
+from common import REPO_DIR, count_nodes, load_bot_module, measure
+import engine
+from storage import Storage, WriteBehind
+
+# Типичные позиции 3x3 для горячих путей
+EMPTY = [" "] * 9
+MIDGAMES = {
+    "midgame_2": ["X", " ", " ", " ", "O", " ", " ", " ", " "],
+    "midgame_3": ["X", " ", " ", " ", "O", " ", " ", " ", "X"],
+    "midgame_5": ["X", "O", " ", " ", "X", " ", " ", " ", "O"],
+}
+WON = ["X", "X", "X", "O", "O", " ", " ", " ", " "]
+FULL = ["X", "O", "X", "X", "O", "O", "O", "X", "X"]
+
+
+def result(seconds: float, **extra) -> dict:
+    return {"seconds_per_call": seconds, "calls_per_second": 1 / seconds if seconds else None, **extra}
+
+
+def import_time(module: str) -> float:
+    # Время импорта модуля с зависимостями в чистом интерпретаторе, по данным -X importtime
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    for line in output.splitlines():
+        _, cumulative, name = line.split("|")
+        # Модуль верхнего уровня - без отступа перед именем
+        if name.rstrip() == f" {module}":
+            return int(cumulative) / 1_000_000
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def bench_engine(repeat: int) -> dict:
+    results = {"import/engine": result(min(import_time("engine") for _ in range(repeat)))}
+    for name, board in [("empty", EMPTY), ("midgame", MIDGAMES["midgame_3"]), ("won", WON), ("full", FULL)]:
+        results[f"check_winner/{name}"] = result(measure(engine.check_winner, board, "X", repeat=repeat, number=10_000))
+        results[f"evaluate_board/{name}"] = result(measure(engine.evaluate_board, board, repeat=repeat, number=10_000))
+
+    for name, board in [("empty", EMPTY)] + list(MIDGAMES.items()):
+        player = "O" if board.count("X") > board.count("O") else "X"
+        opponent = "O" if player == "X" else "X"
+        args = (list(board), 0, True, player, opponent)
+        nodes = count_nodes(engine, "minimax", *args)
+        seconds = measure(engine.minimax, *args, repeat=repeat)
+        results[f"minimax/{name}"] = result(seconds, nodes=nodes, nodes_per_second=nodes / seconds)
+
+    random.seed(0)
+    for difficulty in ("easy", "medium", "hard"):
+        for name, board in [("empty", EMPTY), ("midgame", MIDGAMES["midgame_3"])]:
+            player = "O" if board.count("X") > board.count("O") else "X"
+            results[f"ai_move/{difficulty}/{name}"] = result(
+                measure(lambda: engine.ai_move(list(board), player, difficulty), repeat=repeat, number=1_000)
+            )
+    return results
+
+
+def bench_rendering(repeat: int) -> dict:
+    bot = load_bot_module()
+    board = MIDGAMES["midgame_5"]
+    return {
+        "format_board": result(measure(bot.format_board, board, repeat=repeat, number=10_000)),
+        "create_keyboard/interactive": result(measure(bot.create_keyboard, board, True, repeat=repeat, number=10_000)),
+        "create_keyboard/static": result(measure(bot.create_keyboard, board, False, repeat=repeat, number=10_000)),
+    }
+
+
+def bench_storage(repeat: int) -> dict:
+    bot = load_bot_module()
+    context = SimpleNamespace(user_data={
+        "game_mode": "player_vs_ai", "difficulty": "hard", "human_player": "X", "ai_player": "O",
+    })
+    original = bot.storage, bot.board_writer
+    with tempfile.TemporaryDirectory() as tmp:
+        # Функции хранения работают через bot.board_writer - подменяем его базой во временной папке;
+        # фоновая задача не запущена, поэтому каждая запись идёт в базу сразу
+        bot.storage = Storage(os.path.join(tmp, "game.db"))
+        bot.board_writer = WriteBehind(bot.storage)
+        try:
+            bot.storage.init_schema(os.path.join(REPO_DIR, "database.sql"))
+            board = MIDGAMES["midgame_5"]
+            user_ids = iter(range(10 ** 9))
+            save = measure(lambda: bot.save_board_state(next(user_ids), board, 5, context), repeat=repeat, number=200)
+            load = measure(lambda: bot.load_board_state(1), repeat=repeat, number=1_000)
+            clear = measure(lambda: bot.clear_board_state(next(user_ids)), repeat=repeat, number=200)
+        finally:
+            bot.storage.close()
+            bot.storage, bot.board_writer = original
+    return {
+        "save_board_state": result(save),
+        "load_board_state": result(load),
+        "clear_board_state": result(clear),
+    }
+
+
+SUITES = {
+    "engine": bench_engine,
+    "rendering": bench_rendering,
+    "storage": bench_storage,
+}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    # Сравнение по времени одного вызова: > 1 - медленнее базовой линии
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<36} {'-':>12} {current['seconds_per_call']:>12.3e} {'new':>7}")
+            continue
+        ratio = current["seconds_per_call"] / base["seconds_per_call"]
+        mark = " !" if ratio > 1 + threshold else ""
+        print(f"{name:<36} {base['seconds_per_call']:>12.3e} {current['seconds_per_call']:>12.3e} {ratio:>6.2f}x{mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the game engine and bot hot paths")
+    parser.add_argument("--suite", nargs="+", choices=sorted(SUITES), default=sorted(SUITES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="save results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a JSON file saved with --output")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for suite in args.suite:
+        for name, value in SUITES[suite](args.repeat).items():
+            results[f"{suite}/{name}"] = value
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import time
+import random
+import struct
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import common  # добавляет корень репозитория в sys.path
+import engine
+
+DIFFICULTIES = ("easy", "medium", "hard")
+RESULTS = ("draw", "X", "O")
+
+# Файл результатов: заголовок (магия, размер доски) и по 4 байта на партию -
+# уровень X, уровень O, результат (индекс в RESULTS), число ходов
+FILE_MAGIC = b"TTS1"
+_HEADER = struct.Struct("<4sB")
+_RECORD = struct.Struct("<BBBB")
+
+def _init_worker():
+    logging.disable(logging.CRITICAL)
+
+
+def play_game(size: int, x_difficulty: str, o_difficulty: str, rng: random.Random) -> tuple[int, int]:
+    board = engine.create_board(size)
+    player = "X"
+    for moves in range(1, len(board) + 1):
+        move = engine.ai_move(board, player, x_difficulty if player == "X" else o_difficulty, rng)
+        board[move] = player
+        if engine.check_winner(board, player):
+            return RESULTS.index(player), moves
+        player = "O" if player == "X" else "X"
+    return 0, len(board)
+
+
+def play_chunk(size: int, x_level: int, o_level: int, first_game: int, count: int, seed: int) -> bytes:
+    # Каждая партия со своим генератором: результат не зависит от числа процессов и порядка задач
+    records = bytearray()
+    for game in range(first_game, first_game + count):
+        rng = random.Random(seed * 1_000_000_007 + game)
+        outcome, moves = play_game(size, DIFFICULTIES[x_level], DIFFICULTIES[o_level], rng)
+        records += _RECORD.pack(x_level, o_level, outcome, moves)
+    return bytes(records)
+
+
+def read_results(path: str) -> tuple[int, list]:
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, size = _HEADER.unpack_from(data)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"Not a self-play results file: {path}")
+    return size, list(_RECORD.iter_unpack(data[_HEADER.size:]))
+
+
+def tally(records) -> dict:
+    matrix = {}
+    for x_level, o_level, outcome, _ in records:
+        counts = matrix.setdefault((x_level, o_level), [0, 0, 0])
+        counts[outcome] += 1
+    return matrix
+
+
+def print_matrix(matrix: dict):
+    # Строки - уровень X (ходит первым), столбцы - уровень O; ячейка - победы X / ничьи / победы O
+    print(f"{'X/O':<8}" + "".join(f"{name:>22}" for name in DIFFICULTIES))
+    for x_level, x_name in enumerate(DIFFICULTIES):
+        cells = []
+        for o_level in range(len(DIFFICULTIES)):
+            counts = matrix.get((x_level, o_level))
+            if not counts:
+                cells.append(f"{'-':>22}")
+                continue
+            total = sum(counts)
+            draw, x_wins, o_wins = (count / total for count in counts)
+            cells.append(f"{x_wins:>8.1%}/{draw:>6.1%}/{o_wins:>6.1%}")
+        print(f"{x_name:<8}" + "".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless engine-vs-engine tournament over all difficulty pairs")
+    parser.add_argument("--games", type=int, default=10_000, help="games per difficulty pair")
+    parser.add_argument("--size", type=int, default=3,
+                        help="only 3 is supported: engines for larger boards use wall-clock budgets and the global RNG")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=1_000, help="games per pool task")
+    parser.add_argument("--output", default="selfplay.bin", help="compact results file")
+    parser.add_argument("--report", help="print matrices from an existing results file and exit")
+    args = parser.parse_args()
+
+    if args.report:
+        size, records = read_results(args.report)
+        print(f"{len(records)} games on {size}x{size}")
+        print_matrix(tally(records))
+        return
+
+    # Партия воспроизводима только на 3x3: там все уровни берут ход из таблицы через переданный rng.
+    # На больших досках поиск останавливается по времени, и результат зависит от загрузки процессов.
+    if args.size != 3:
+        parser.error("--size: reproducible tournaments are only supported on 3x3 boards")
+
+    tasks = []
+    game = 0
+    for x_level in range(len(DIFFICULTIES)):
+        for o_level in range(len(DIFFICULTIES)):
+            for first in range(0, args.games, args.chunk):
+                count = min(args.chunk, args.games - first)
+                tasks.append((args.size, x_level, o_level, game, count, args.seed))
+                game += count
+
+    matrix = {}
+    started = time.perf_counter()
+    with open(args.output, "wb") as f, ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        f.write(_HEADER.pack(FILE_MAGIC, args.size))
+        # map отдаёт куски по порядку задач, поэтому файл одинаков при любом числе процессов
+        for records in pool.map(play_chunk, *zip(*tasks)):
+            f.write(records)
+            for key, counts in tally(_RECORD.iter_unpack(records)).items():
+                total = matrix.setdefault(key, [0, 0, 0])
+                for i, count in enumerate(counts):
+                    total[i] += count
+    elapsed = time.perf_counter() - started
+
+    print(f"{game} games on {args.size}x{args.size} with {args.workers} workers in {elapsed:.1f}s "
+          f"({game / elapsed:,.0f} games/s), results in {args.output}")
+    print_matrix(matrix)
+
+
+if __name__ == "__main__":
+    main()
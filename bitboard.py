@@ -0,0 +1,96 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bitboard game core: each side is a 9-bit integer, bit i = cell i of the
+# list board used by the Telegram handlers (0..8, row by row).
+FULL_MASK = 0x1FF
+WIN_MASKS = tuple(
+    (1 << a) | (1 << b) | (1 << c)
+    for a, b, c in [(0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6)]
+)
+
+# Для каждой из 512 комбинаций клеток заранее известно, содержит ли она линию
+_WINNING = bytes(any(bits & mask == mask for mask in WIN_MASKS) for bits in range(FULL_MASK + 1))
+
+
+def to_bitboards(board: list) -> tuple[int, int]:
+    x_bits = 0
+    o_bits = 0
+    for i, cell in enumerate(board):
+        if cell == "X":
+            x_bits |= 1 << i
+        elif cell == "O":
+            o_bits |= 1 << i
+    return x_bits, o_bits
+
+
+def from_bitboards(x_bits: int, o_bits: int) -> list:
+    return ["X" if x_bits >> i & 1 else "O" if o_bits >> i & 1 else " " for i in range(9)]
+
+
+def create_board() -> tuple[int, int]:
+    return 0, 0
+
+
+def check_winner(bits: int) -> bool:
+    return _WINNING[bits]
+
+
+def is_board_full(x_bits: int, o_bits: int) -> bool:
+    return x_bits | o_bits == FULL_MASK
+
+
+def get_available_moves(x_bits: int, o_bits: int) -> list:
+    moves = []
+    free = ~(x_bits | o_bits) & FULL_MASK
+    while free:
+        low = free & -free
+        moves.append(low.bit_length() - 1)
+        free ^= low
+    return moves
+
+
+def evaluate_board(x_bits: int, o_bits: int) -> int | None:
+    if _WINNING[o_bits]:
+        return 1
+    elif _WINNING[x_bits]:
+        return -1
+    elif x_bits | o_bits == FULL_MASK:
+        return 0
+    return None
+
+
+def minimax(x_bits: int, o_bits: int, depth: int, is_maximizing: bool, player: str,
+            alpha: float = -float("inf"), beta: float = float("inf")) -> float:
+    # Та же семантика, что и у списочного minimax: +1 - победа O, -1 - победа X
+    if _WINNING[o_bits]:
+        return 1
+    if _WINNING[x_bits]:
+        return -1
+    occupied = x_bits | o_bits
+    if occupied == FULL_MASK:
+        return 0
+    place_x = (player == "X") == is_maximizing
+    best_score = -float("inf") if is_maximizing else float("inf")
+    free = ~occupied & FULL_MASK
+    while free:
+        bit = free & -free
+        free ^= bit
+        if place_x:
+            score = minimax(x_bits | bit, o_bits, depth + 1, not is_maximizing, player, alpha, beta)
+        else:
+            score = minimax(x_bits, o_bits | bit, depth + 1, not is_maximizing, player, alpha, beta)
+        if is_maximizing:
+            if score > best_score:
+                best_score = score
+            if best_score > alpha:
+                alpha = best_score
+        else:
+            if score < best_score:
+                best_score = score
+            if best_score < beta:
+                beta = best_score
+        if beta <= alpha:
+            break
+    return best_score
@@ -1,20 +1,51 @@
+-- Текущее состояние партии, одна строка на пользователя.
+-- board: число клеток (0 - Ultimate) и доска в троичной системе, см. storage.encode_board
+-- mode: режим | сложность << 4; symbols: по 2 бита на роль X/O (storage.SYMBOL_FIELDS)
+-- Изменения схемы - через миграции в storage.MIGRATIONS (PRAGMA user_version)
 CREATE TABLE IF NOT EXISTS game_state (
-    user_id BIGINT PRIMARY KEY,
-    board TEXT NOT NULL,
+    user_id INTEGER PRIMARY KEY,
+    board BLOB NOT NULL,
     move_count INTEGER NOT NULL,
-    game_mode TEXT,
-    difficulty TEXT,
-    human_player TEXT,
-    ai_player TEXT,
-    ai1_symbol TEXT,
-    ai2_symbol TEXT,
-    player1_symbol TEXT,
-    player2_symbol TEXT
+    mode INTEGER NOT NULL DEFAULT 0,
+    symbols INTEGER NOT NULL DEFAULT 0
 );
 
+-- Итоги игр против ИИ по пользователю и сложности (storage.difficulty_code, 0 - неизвестна);
+-- счётчики только прибавляются (UPSERT в storage.UPSERT_STATS_SQL)
 CREATE TABLE IF NOT EXISTS game_stats (
-    user_id BIGINT PRIMARY KEY,
-    wins INTEGER DEFAULT 0,
-    losses INTEGER DEFAULT 0,
-    draws INTEGER DEFAULT 0
-);
\ No newline at end of file
+    user_id INTEGER NOT NULL,
+    difficulty INTEGER NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, difficulty)
+) WITHOUT ROWID;
+
+-- История партий только дописывается. games - итог партии (пишется по её окончании),
+-- moves - ходы по порядку; по ним партию можно повторить (storage.replay).
+-- cells: число клеток доски (0 - Ultimate); mode, symbols - как в game_state;
+-- result: storage.RESULTS; started_at, ended_at - unix-время в секундах
+CREATE TABLE IF NOT EXISTS games (
+    game_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    cells INTEGER NOT NULL,
+    mode INTEGER NOT NULL,
+    symbols INTEGER NOT NULL,
+    result INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    started_at INTEGER NOT NULL,
+    ended_at INTEGER NOT NULL
+);
+
+-- Партии пользователя по времени и выборки за день (диапазон по started_at)
+CREATE INDEX IF NOT EXISTS games_by_user ON games (user_id, started_at);
+CREATE INDEX IF NOT EXISTS games_by_time ON games (started_at);
+
+-- symbol: 1 - X, 2 - O (storage.SYMBOLS)
+CREATE TABLE IF NOT EXISTS moves (
+    game_id INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    cell INTEGER NOT NULL,
+    symbol INTEGER NOT NULL,
+    PRIMARY KEY (game_id, ply)
+) WITHOUT ROWID;
@@ -0,0 +1,179 @@
+import random
+import logging
+
+import solved_table
+import bitboard
+import transposition
+import nxn_engine
+import mcts
+import qubic
+import search_stats
+
+logger = logging.getLogger(__name__)
+
+# Какой движок ищет ход на досках больше 3x3: альфа-бета для небольших, MCTS для 7x7
+ENGINES = {
+    "alphabeta": nxn_engine.ai_move,
+    "mcts": mcts.ai_move,
+    "qubic": qubic.ai_move,
+}
+ENGINE_BY_SIZE = {4: "alphabeta", 5: "alphabeta", 7: "mcts"}
+
+# Игровая логика без Telegram, dotenv и базы данных: импортируется ботом,
+# процессами пула, бенчмарками и self-play без побочных эффектов
+
+ai_memory = {}
+human_memory = {}
+stats = {
+    "AI": {"wins": 0, "losses": 0, "draws": 0},
+    "Human": {"wins": 0, "losses": 0, "draws": 0},
+}
+
+
+def create_board(size: int = 3):
+    return [" " for _ in range(size * size)]
+
+
+def check_winner(board: list, player: str) -> bool:
+    if len(board) == qubic.CELLS:
+        return qubic.check_winner(board, player)
+    if len(board) != 9:
+        return nxn_engine.check_winner(board, player)
+    wins = [(0,1,2), (3,4,5), (6,7,8), (0,3,6), (1,4,7), (2,5,8), (0,4,8), (2,4,6)]
+    return any(board[a] == board[b] == board[c] == player for a, b, c in wins)
+
+
+def is_board_full(board: list) -> bool:
+    return " " not in board
+
+
+def get_available_moves(board: list) -> list:
+    return [i for i, spot in enumerate(board) if spot == " "]
+
+
+def update_stats(winner: str | None):
+    if winner == "AI":
+        stats["AI"]["wins"] += 1
+        stats["Human"]["losses"] += 1
+    elif winner == "Human":
+        stats["Human"]["wins"] += 1
+        stats["AI"]["losses"] += 1
+    else:
+        stats["AI"]["draws"] += 1
+        stats["Human"]["draws"] += 1
+
+
+def evaluate_board(board: list) -> int | None:
+    if check_winner(board, "O"):
+        return 1
+    elif check_winner(board, "X"):
+        return -1
+    elif is_board_full(board):
+        return 0
+    return None
+
+
+def minimax(board: list, depth: int, is_maximizing: bool, player: str, opponent: str, alpha: float=-float("inf"), beta: float=float("inf")) -> float:
+    score = evaluate_board(board)
+    if score is not None:
+        return score
+    if is_maximizing:
+        best_score = -float("inf")
+        for move in get_available_moves(board):
+            board[move] = player
+            score = minimax(board, depth + 1, False, player, opponent, alpha, beta)
+            board[move] = " "
+            best_score = max(best_score, score)
+            alpha = max(alpha, best_score)
+            if beta <= alpha:
+                break
+        return best_score
+    else:
+        best_score = float("inf")
+        for move in get_available_moves(board):
+            board[move] = opponent
+            score = minimax(board, depth + 1, True, player, opponent, alpha, beta)
+            board[move] = " "
+            best_score = min(best_score, score)
+            beta = min(beta, best_score)
+            if beta <= alpha:
+                break
+        return best_score
+
+
+def ai_move(board, player, difficulty, rng=random):
+    with search_stats.measure(difficulty):
+        return _ai_move(board, player, difficulty, rng)
+
+
+def _ai_move(board, player, difficulty, rng):
+    logger.debug(f"AI move called with board: {board}, player: {player}, difficulty: {difficulty}")
+    available_moves = [i for i in range(len(board)) if board[i] == " "]
+    if not available_moves:
+        logger.error(f"No available moves on board: {board}")
+        return None
+    if len(board) != 9:
+        # Доски больше 3x3: альфа-бета с итеративным углублением или MCTS, по размеру доски
+        return search_move(board, player, difficulty)
+    # Все уровни 3x3 выбирают ход по таблице ценностей, уровень задаёт только температуру
+    values = solved_table.move_values(board, player)
+    if values is not None and any(values):
+        search_stats.set_engine("table")
+        temperature = solved_table.DIFFICULTY_TEMPERATURE.get(difficulty, solved_table.DIFFICULTY_TEMPERATURE["medium"])
+        return solved_table.sample_move(values, temperature, rng)
+    if difficulty == "hard":
+        # Позиции нет в таблице (доска не из обычной партии) - полный перебор
+        search_stats.set_engine("minimax")
+        best_score = -float("inf")
+        best_move = None
+        x_bits, o_bits = bitboard.to_bitboards(board)
+        for move in available_moves:
+            if player == "X":
+                score = transposition.minimax(x_bits | 1 << move, o_bits, 0, False, player)
+            else:
+                score = transposition.minimax(x_bits, o_bits | 1 << move, 0, False, player)
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_move if best_move is not None else rng.choice(available_moves)
+    search_stats.set_engine("random")
+    return rng.choice(available_moves)
+
+
+def search_move(board: list, player: str, difficulty: str, time_budget: float | None = None) -> int | None:
+    if len(board) == qubic.CELLS:
+        search_stats.set_engine("qubic")
+        return qubic.ai_move(board, player, difficulty, time_budget)
+    name = ENGINE_BY_SIZE.get(nxn_engine.board_size(board), "alphabeta")
+    search_stats.set_engine(name)
+    return ENGINES[name](board, player, difficulty, time_budget)
+
+
+def best_hint(board, player):
+    # Лучший ход из таблицы ценностей; None, если таблица доску не покрывает
+    values = solved_table.move_values(board, player)
+    if values is not None:
+        best = solved_table.best_moves(values)
+        return best[0] if best else None
+    return None
+
+
+def update_memory(board: list, move: int, player: str, outcome: str):
+    board_key = str(tuple(board))
+    memory = ai_memory if player == "O" else human_memory
+    if len(memory) > 1000:
+        oldest_key = next(iter(memory))
+        memory.pop(oldest_key)
+        logger.debug(f"Memory limit reached, removed oldest key: {oldest_key}")
+    if board_key not in memory:
+        memory[board_key] = {"moves": [], "weights": []}
+    if move not in memory[board_key]["moves"]:
+        memory[board_key]["moves"].append(move)
+        weight = 1.0 if outcome == "win" else 0.5 if outcome == "draw" else 0.1
+        memory[board_key]["weights"].append(weight)
+        logger.debug(f"Added new move {move} for board {board_key} with weight {weight}")
+    else:
+        idx = memory[board_key]["moves"].index(move)
+        weight = memory[board_key]["weights"][idx]
+        if outcome == "win":
+            memory[board_key]["weights"][idx] = min(weight + 0.5, 2.0)
@@ -0,0 +1,101 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import nxn_engine
+import ultimate
+import search_stats
+from engine import search_move
+
+logger = logging.getLogger(__name__)
+
+# Запас времени на передачу задачи в процесс и обратно
+_TIMEOUT_MARGIN = 0.25
+
+
+def _warm_worker():
+    # Линии и соседи для всех размеров считаются один раз при старте процесса
+    for size in nxn_engine.WIN_LENGTH:
+        nxn_engine.win_lines(size)
+        nxn_engine.cell_lines(size)
+        nxn_engine.neighbours(size)
+
+
+def _ping() -> bool:
+    return True
+
+
+def _measured(enabled: bool, difficulty: str, engine: str, func, *args) -> tuple:
+    # Замер выполняется в процессе пула, в бота возвращается только кортеж с числами
+    search_stats.enable(enabled)
+    with search_stats.measure(difficulty, engine, record_sample=False) as probe:
+        result = func(*args)
+    return result, probe.sample() if probe is not None else None
+
+
+class AsyncEngine:
+    def __init__(self, max_workers: int | None = None, timeout: float = 5.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.timeouts = 0
+        self._executor = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_warm_worker)
+            # Поднимаем все процессы заранее, чтобы первый ход не ждал запуска
+            for future in [self._executor.submit(_ping) for _ in range(self.max_workers)]:
+                future.result()
+            logger.info(f"Engine pool started with {self.max_workers} workers")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Engine pool stopped")
+
+    async def move(self, board: list, player: str, difficulty: str, timeout: float | None = None) -> int | None:
+        return await self._run(difficulty, search_move, list(board), player, difficulty, timeout=timeout)
+
+    async def ultimate_move(self, encoded: str, difficulty: str, timeout: float | None = None) -> int | None:
+        return await self._run(difficulty, ultimate.ai_move, encoded, difficulty, timeout=timeout, engine="ultimate")
+
+    async def _run(self, difficulty: str, func, *args, timeout: float | None = None, engine: str = "unknown"):
+        self.start()
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Поиск сам укладывается в бюджет (последний аргумент); wait_for страхует от очереди к процессам
+        future = loop.run_in_executor(
+            self._executor, _measured, search_stats.enabled, difficulty, engine,
+            func, *args, max(timeout - _TIMEOUT_MARGIN, 0.05)
+        )
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            move, sample = await asyncio.wait_for(future, timeout)
+            self.completed += 1
+            if sample is not None:
+                search_stats.record(sample)
+            return move
+        except asyncio.TimeoutError:
+            # wait_for отменяет задачу, если она ещё стоит в очереди пула
+            self.timeouts += 1
+            logger.warning(f"Engine search timed out after {timeout}s, queue depth: {self.pending}")
+            raise
+        finally:
+            self.pending -= 1
+            logger.debug(f"Engine search finished in {time.perf_counter() - started:.3f}s, queue depth: {self.pending}")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.pending,
+            "peak_queue_depth": self.peak_pending,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+        }
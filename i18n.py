@@ -0,0 +1,76 @@
+import os
+import json
+import logging
+from string import Formatter
+
+logger = logging.getLogger(__name__)
+
+# Каталоги переводов: locales/<язык>.json. Каталог читается при первом обращении к языку,
+# недостающие ключи берутся из языка по умолчанию.
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+DEFAULT_LANGUAGE = "ru"
+
+_catalogs = {}
+_unsupported = set()
+_formatter = Formatter()
+
+
+def _read(lang: str) -> dict:
+    with open(os.path.join(LOCALES_DIR, f"{lang}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def available_languages() -> list:
+    return sorted(name[:-len(".json")] for name in os.listdir(LOCALES_DIR) if name.endswith(".json"))
+
+
+def compile_template(text: str):
+    # Строка без подстановок хранится готовой и отдаётся без format
+    parts = list(_formatter.parse(text))
+    if all(field is None for _, field, _, _ in parts):
+        return "".join(literal for literal, _, _, _ in parts)
+    return text.format
+
+
+def catalog(lang: str) -> dict | None:
+    texts = _catalogs.get(lang)
+    if texts is not None:
+        return texts
+    if lang in _unsupported or not lang.isalpha():
+        return None
+    try:
+        raw = _read(lang)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Translation catalog {lang} unavailable: {e}")
+        _unsupported.add(lang)
+        return None
+    texts = dict(catalog(DEFAULT_LANGUAGE) or {}) if lang != DEFAULT_LANGUAGE else {}
+    texts.update((key, compile_template(text)) for key, text in raw.items())
+    _catalogs[lang] = texts
+    logger.debug(f"Loaded translation catalog {lang}: {len(raw)} keys")
+    return texts
+
+
+def render(texts: dict, key: str, **kwargs) -> str:
+    template = texts.get(key, key)
+    if type(template) is str:
+        return template
+    return template(**kwargs)
+
+
+def text(lang: str, key: str, **kwargs) -> str:
+    return render(catalog(lang) or catalog(DEFAULT_LANGUAGE), key, **kwargs)
+
+
+def missing_keys() -> dict:
+    # Проверка при запуске: ключи языка по умолчанию, которых нет в остальных каталогах
+    reference = _read(DEFAULT_LANGUAGE)
+    report = {}
+    for lang in available_languages():
+        if lang == DEFAULT_LANGUAGE:
+            continue
+        keys = _read(lang)
+        missing = [key for key in reference if key not in keys]
+        if missing:
+            report[lang] = missing
+    return report
@@ -0,0 +1,229 @@
+import math
+import time
+import random
+import logging
+from collections import OrderedDict
+
+import nxn_engine
+import search_stats
+
+logger = logging.getLogger(__name__)
+
+# Бюджет по сложности: (число партий-симуляций, секунд на ход)
+PLAYOUT_BUDGETS = {
+    "easy": (200, 0.2),
+    "medium": (1000, 0.5),
+    "hard": (5000, 2.0),
+}
+
+EXPLORATION = 1.4
+
+# Сколько узлов сохранённых поддеревьев держать между поисками. Замер на 7x7 (hard, 5000
+# симуляций, benchmarks/bench_mcts.py): ~0.5 КБ на узел вместе со списками ходов, т.е. ~5 МБ
+# на процесс пула
+NODE_BUDGET = 10_000
+
+
+class NxNState:
+    # Позиция N×N для MCTS: изменяемая, копируется перед симуляцией
+    __slots__ = ("board", "size", "to_move", "winner", "empty")
+
+    def __init__(self, board: list, size: int, to_move: str, winner: str | None = None):
+        self.board = board
+        self.size = size
+        self.to_move = to_move
+        self.winner = winner
+        self.empty = sum(cell == " " for cell in board)
+
+    @classmethod
+    def from_board(cls, board: list, player: str) -> "NxNState":
+        size = nxn_engine.board_size(board)
+        winner = next((s for s in ("X", "O") if nxn_engine.check_winner(board, s)), None)
+        return cls(list(board), size, player, winner)
+
+    def copy(self) -> "NxNState":
+        state = NxNState.__new__(NxNState)
+        state.board = list(self.board)
+        state.size = self.size
+        state.to_move = self.to_move
+        state.winner = self.winner
+        state.empty = self.empty
+        return state
+
+    def is_terminal(self) -> bool:
+        return self.winner is not None or self.empty == 0
+
+    def legal_moves(self) -> list:
+        if self.is_terminal():
+            return []
+        return nxn_engine.candidate_moves(self.board, self.size)
+
+    def apply(self, move: int):
+        player = self.to_move
+        self.board[move] = player
+        self.empty -= 1
+        if nxn_engine.wins_with(self.board, move, player, self.size):
+            self.winner = player
+        self.to_move = "O" if player == "X" else "X"
+
+    def rollout(self, rng: random.Random) -> str | None:
+        # Случайная доигровка до конца партии; возвращает победителя или None при ничьей
+        if self.winner is not None:
+            return self.winner
+        board = self.board
+        size = self.size
+        cells = [i for i, cell in enumerate(board) if cell == " "]
+        rng.shuffle(cells)
+        player = self.to_move
+        for move in cells:
+            board[move] = player
+            if nxn_engine.wins_with(board, move, player, size):
+                return player
+            player = "O" if player == "X" else "X"
+        return None
+
+    def key(self) -> tuple:
+        return "".join(self.board), self.to_move
+
+
+class Node:
+    __slots__ = ("move", "parent", "player", "children", "untried", "visits", "wins")
+
+    def __init__(self, move, parent, player: str | None, untried: list):
+        self.move = move
+        self.parent = parent
+        self.player = player  # кто сделал ход, ведущий в этот узел
+        self.children = {}
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self, exploration: float) -> "Node":
+        log_visits = math.log(self.visits)
+        return max(
+            self.children.values(),
+            key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+        )
+
+
+def subtree_size(node: "Node") -> int:
+    size = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        size += 1
+        stack.extend(node.children.values())
+    return size
+
+
+class MCTS:
+    def __init__(self, exploration: float = EXPLORATION, node_budget: int = NODE_BUDGET, rng: random.Random | None = None):
+        self.exploration = exploration
+        self.node_budget = node_budget
+        self.rng = rng or random.Random()
+        # Поддеревья, сохранённые после прошлых ходов: позиция -> (узел, размер поддерева).
+        # Ограничено общим числом узлов, а не числом поддеревьев: поддерево бывает в тысячи узлов
+        self.index = OrderedDict()
+        self.index_nodes = 0
+        self.reused = 0
+        self.last_playouts = 0
+
+    def _root_for(self, state) -> "Node":
+        entry = self.index.pop(state.key(), None)
+        if entry is not None:
+            node, size = entry
+            self.index_nodes -= size
+            self.reused += 1
+            return node
+        return Node(None, None, None, state.legal_moves())
+
+    def _remember(self, state, node: "Node"):
+        size = subtree_size(node)
+        if size > self.node_budget:
+            return
+        # Отцепляем поддерево от дерева поиска: иначе через parent оно держит в памяти всё дерево
+        node.parent = None
+        node.move = None
+        old = self.index.pop(state.key(), None)
+        if old is not None:
+            self.index_nodes -= old[1]
+        self.index[state.key()] = (node, size)
+        self.index_nodes += size
+        while self.index_nodes > self.node_budget:
+            _, (_, evicted) = self.index.popitem(last=False)
+            self.index_nodes -= evicted
+
+    def search(self, state, playouts: int | None = None, time_budget: float | None = None):
+        if state.is_terminal():
+            return None
+        if playouts is None and time_budget is None:
+            playouts = PLAYOUT_BUDGETS["medium"][0]
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        reused = self.index.get(state.key()) is not None
+        root = self._root_for(state)
+        done = 0
+        max_depth = 0
+        while (playouts is None or done < playouts) and (deadline is None or time.perf_counter() < deadline):
+            node = root
+            current = state.copy()
+            depth = 0
+            # Выбор: спускаемся по UCT, пока все ходы узла раскрыты
+            while not node.untried and node.children:
+                node = node.select_child(self.exploration)
+                current.apply(node.move)
+                depth += 1
+            if depth > max_depth:
+                max_depth = depth
+            # Раскрытие одного нового хода
+            if node.untried:
+                move = node.untried.pop(self.rng.randrange(len(node.untried)))
+                player = current.to_move
+                current.apply(move)
+                child = Node(move, node, player, current.legal_moves())
+                node.children[move] = child
+                node = child
+            winner = current.rollout(self.rng)
+            # Обратное распространение результата
+            while node is not None:
+                node.visits += 1
+                if winner is None:
+                    node.wins += 0.5
+                elif winner == node.player:
+                    node.wins += 1.0
+                node = node.parent
+            done += 1
+        self.last_playouts = done
+        probe = search_stats.probe
+        if probe is not None:
+            # Для MCTS узлы - это симуляции, попадание в таблицу - переиспользованное дерево
+            probe.nodes += done
+            probe.max_depth = max(probe.max_depth, max_depth)
+            probe.tt_hits += reused
+        if not root.children:
+            moves = state.legal_moves()
+            return moves[0] if moves else None
+        best = max(root.children.values(), key=lambda child: child.visits)
+
+        # Сохраняем ответы соперника на выбранный ход: следующий поиск начнётся с одного из них
+        after = state.copy()
+        after.apply(best.move)
+        for reply, node in best.children.items():
+            position = after.copy()
+            position.apply(reply)
+            self._remember(position, node)
+        logger.debug(f"MCTS: playouts={done}, root visits={root.visits}, move={best.move}, reused={self.reused}")
+        return best.move
+
+
+# Одно дерево на процесс: поддеревья переиспользуются между ходами одной партии
+default_engine = MCTS()
+
+
+def ai_move(board: list, player: str, difficulty: str, time_budget: float | None = None) -> int | None:
+    playouts, limit = PLAYOUT_BUDGETS.get(difficulty, PLAYOUT_BUDGETS["medium"])
+    time_budget = limit if time_budget is None else min(limit, time_budget)
+    forced = nxn_engine.forced_move(board, player, nxn_engine.board_size(board))
+    if forced is not None:
+        return forced
+    state = NxNState.from_board(board, player)
+    return default_engine.search(state, playouts=playouts, time_budget=time_budget)
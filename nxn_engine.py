@@ -0,0 +1,250 @@
+import math
+import time
+import random
+import logging
+from functools import lru_cache
+
+import search_stats
+
+logger = logging.getLogger(__name__)
+
+# Размер доски -> сколько в ряд нужно для победы (7x7 - "гомоку-лайт")
+WIN_LENGTH = {3: 3, 4: 4, 5: 4, 7: 5}
+
+# Ограничения поиска по сложности: (секунд на ход, максимальная глубина)
+DIFFICULTY_LIMITS = {
+    "easy": (0.2, 1),
+    "medium": (0.5, 2),
+    "hard": (2.0, None),
+}
+
+WIN_SCORE = 1_000_000
+_CHECK_EVERY = 256
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def board_size(board: list) -> int:
+    size = math.isqrt(len(board))
+    if size * size != len(board) or size not in WIN_LENGTH:
+        raise ValueError(f"Unsupported board with {len(board)} cells")
+    return size
+
+
+def is_supported_board(board: list) -> bool:
+    size = math.isqrt(len(board))
+    return size * size == len(board) and size in WIN_LENGTH
+
+
+@lru_cache(maxsize=None)
+def win_lines(size: int) -> tuple:
+    k = WIN_LENGTH[size]
+    lines = []
+    for row in range(size):
+        for col in range(size):
+            for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                end_row = row + d_row * (k - 1)
+                end_col = col + d_col * (k - 1)
+                if 0 <= end_row < size and 0 <= end_col < size:
+                    lines.append(tuple((row + d_row * j) * size + col + d_col * j for j in range(k)))
+    return tuple(lines)
+
+
+@lru_cache(maxsize=None)
+def cell_lines(size: int) -> tuple:
+    # Для каждой клетки - линии, которые через неё проходят
+    by_cell = [[] for _ in range(size * size)]
+    for line in win_lines(size):
+        for cell in line:
+            by_cell[cell].append(line)
+    return tuple(tuple(lines) for lines in by_cell)
+
+
+@lru_cache(maxsize=None)
+def neighbours(size: int) -> tuple:
+    result = []
+    for cell in range(size * size):
+        row, col = divmod(cell, size)
+        result.append(tuple(
+            r * size + c
+            for r in range(max(0, row - 1), min(size, row + 2))
+            for c in range(max(0, col - 1), min(size, col + 2))
+            if (r, c) != (row, col)
+        ))
+    return tuple(result)
+
+
+def check_winner(board: list, player: str) -> bool:
+    return any(all(board[i] == player for i in line) for line in win_lines(board_size(board)))
+
+
+def wins_with(board: list, cell: int, player: str, size: int) -> bool:
+    # Достаточно проверить линии через последнюю занятую клетку
+    return any(all(board[i] == player for i in line) for line in cell_lines(size)[cell])
+
+
+def evaluate(board: list, player: str, size: int) -> int:
+    # Эвристика для незавершённой позиции: открытые линии с весом по числу своих фишек
+    opponent = "O" if player == "X" else "X"
+    score = 0
+    for line in win_lines(size):
+        mine = theirs = 0
+        for i in line:
+            if board[i] == player:
+                mine += 1
+            elif board[i] == opponent:
+                theirs += 1
+        if theirs == 0 and mine:
+            score += 4 ** mine
+        elif mine == 0 and theirs:
+            score -= 4 ** theirs
+    return score
+
+
+def candidate_moves(board: list, size: int) -> list:
+    empty = [i for i, cell in enumerate(board) if cell == " "]
+    if size <= 4 or len(empty) == len(board):
+        return empty
+    # На больших досках рассматриваем только клетки рядом с уже занятыми
+    near = neighbours(size)
+    return [i for i in empty if any(board[j] != " " for j in near[i])]
+
+
+def _order_moves(board: list, moves: list, player: str, size: int, first: int | None) -> list:
+    opponent = "O" if player == "X" else "X"
+    lines = cell_lines(size)
+
+    def priority(cell):
+        value = 0
+        for line in lines[cell]:
+            mine = sum(board[i] == player for i in line)
+            theirs = sum(board[i] == opponent for i in line)
+            if theirs == 0:
+                value += 4 ** mine
+            if mine == 0:
+                value += 4 ** theirs
+        return value
+
+    ordered = sorted(moves, key=priority, reverse=True)
+    if first is not None and first in ordered:
+        ordered.remove(first)
+        ordered.insert(0, first)
+    return ordered
+
+
+class _Search:
+    def __init__(self, board: list, size: int, deadline: float):
+        self.board = board
+        self.size = size
+        self.deadline = deadline
+        self.nodes = 0
+        self.cutoffs = 0
+
+    def negamax(self, player: str, depth: int, alpha: float, beta: float, last_move: int) -> float:
+        self.nodes += 1
+        if self.nodes % _CHECK_EVERY == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        board = self.board
+        opponent = "O" if player == "X" else "X"
+        if wins_with(board, last_move, opponent, self.size):
+            # Чем раньше победа соперника, тем хуже
+            return -WIN_SCORE - depth
+        moves = candidate_moves(board, self.size)
+        if not moves:
+            return 0
+        if depth == 0:
+            return evaluate(board, player, self.size)
+        best = -float("inf")
+        for move in _order_moves(board, moves, player, self.size, None):
+            board[move] = player
+            try:
+                score = -self.negamax(opponent, depth - 1, -beta, -alpha, move)
+            finally:
+                board[move] = " "
+            if score > best:
+                best = score
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                self.cutoffs += 1
+                break
+        return best
+
+    def root(self, player: str, depth: int, moves: list) -> tuple[int, float]:
+        opponent = "O" if player == "X" else "X"
+        alpha = -float("inf")
+        best_move = moves[0]
+        for move in moves:
+            self.board[move] = player
+            try:
+                score = -self.negamax(opponent, depth - 1, -float("inf"), -alpha, move)
+            finally:
+                self.board[move] = " "
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return best_move, alpha
+
+
+def forced_move(board: list, player: str, size: int) -> int | None:
+    # Немедленная победа или блокировка не требуют поиска
+    opponent = "O" if player == "X" else "X"
+    empty = [i for i, cell in enumerate(board) if cell == " "]
+    for symbol in (player, opponent):
+        for move in empty:
+            board[move] = symbol
+            won = wins_with(board, move, symbol, size)
+            board[move] = " "
+            if won:
+                return move
+    return None
+
+
+def best_move(board: list, player: str, time_budget: float = 1.0, max_depth: int | None = None) -> int | None:
+    size = board_size(board)
+    deadline = time.perf_counter() + time_budget
+    empty = [i for i, cell in enumerate(board) if cell == " "]
+    if not empty:
+        return None
+    if len(empty) == len(board):
+        return (size // 2) * size + size // 2
+
+    forced = forced_move(board, player, size)
+    if forced is not None:
+        return forced
+
+    work = list(board)
+    search = _Search(work, size, deadline)
+    moves = _order_moves(work, candidate_moves(work, size), player, size, None)
+    best = moves[0]
+    limit = max_depth or len(empty)
+    depth = 0
+    # Итеративное углубление: ответ последней завершённой глубины всегда наготове
+    for depth in range(1, limit + 1):
+        try:
+            move, score = search.root(player, depth, moves)
+        except SearchTimeout:
+            depth -= 1
+            break
+        best = move
+        if abs(score) >= WIN_SCORE:
+            break
+        moves = _order_moves(work, moves, player, size, best)
+    probe = search_stats.probe
+    if probe is not None:
+        probe.nodes += search.nodes
+        probe.cutoffs += search.cutoffs
+        probe.max_depth = max(probe.max_depth, depth)
+    logger.debug(f"NxN search: size={size}, depth={depth}, nodes={search.nodes}, move={best}")
+    return best
+
+
+def ai_move(board: list, player: str, difficulty: str, time_budget: float | None = None) -> int | None:
+    limit, max_depth = DIFFICULTY_LIMITS.get(difficulty, DIFFICULTY_LIMITS["medium"])
+    time_budget = limit if time_budget is None else min(limit, time_budget)
+    if difficulty == "easy" and random.random() < 0.5:
+        empty = [i for i, cell in enumerate(board) if cell == " "]
+        return random.choice(empty) if empty else None
+    return best_move(board, player, time_budget, max_depth)
@@ -0,0 +1,295 @@
+import time
+import random
+import logging
+
+import search_stats
+
+logger = logging.getLogger(__name__)
+
+# Qubic: куб 4x4x4, клетка = слой * 16 + строка * 4 + столбец, каждая сторона - 64-битная маска
+SIZE = 4
+CELLS = SIZE ** 3
+FULL_MASK = (1 << CELLS) - 1
+
+# Ограничения поиска по сложности: (секунд на ход, максимальная глубина)
+DIFFICULTY_LIMITS = {
+    "easy": (0.3, 1),
+    "medium": (1.0, 2),
+    "hard": (3.0, None),
+}
+
+WIN_SCORE = 1_000_000
+_CHECK_EVERY = 512
+# Вес линии по числу своих фишек (линии, где есть фишки обеих сторон, не считаются)
+LINE_WEIGHTS = (0, 1, 8, 64, 0)
+
+
+def _build_lines() -> tuple:
+    lines = set()
+    directions = [
+        (dl, dr, dc)
+        for dl in (-1, 0, 1) for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+        if (dl, dr, dc) != (0, 0, 0)
+    ]
+    for layer in range(SIZE):
+        for row in range(SIZE):
+            for col in range(SIZE):
+                for dl, dr, dc in directions:
+                    cells = [(layer + dl * i, row + dr * i, col + dc * i) for i in range(SIZE)]
+                    if all(0 <= c < SIZE for cell in cells for c in cell):
+                        lines.add(sum(1 << (l * 16 + r * 4 + c) for l, r, c in cells))
+    return tuple(sorted(lines))
+
+
+def _build_directions() -> tuple:
+    # (сдвиг, маска начальных клеток): линия из start идёт через start + step, + 2 * step, + 3 * step
+    directions = []
+    for dl in (-1, 0, 1):
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                step = dl * 16 + dr * 4 + dc
+                if step <= 0:
+                    continue
+                start = 0
+                for layer in range(SIZE):
+                    for row in range(SIZE):
+                        for col in range(SIZE):
+                            end = (layer + dl * 3, row + dr * 3, col + dc * 3)
+                            if all(0 <= c < SIZE for c in end):
+                                start |= 1 << (layer * 16 + row * 4 + col)
+                directions.append((step, start))
+    return tuple(directions)
+
+
+# 76 выигрышных линий
+LINES = _build_lines()
+# 13 направлений: те же 76 линий, проверяемые сдвигами всей маски
+DIRECTIONS = _build_directions()
+CELL_LINES = tuple(tuple(line for line in LINES if line >> cell & 1) for cell in range(CELLS))
+# Клетки на большем числе линий (углы и центр куба - по 7 линий) полезнее
+CELL_ORDER = tuple(sorted(range(CELLS), key=lambda cell: -len(CELL_LINES[cell])))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def to_bitboards(board: list) -> tuple[int, int]:
+    x_bits = 0
+    o_bits = 0
+    for i, cell in enumerate(board):
+        if cell == "X":
+            x_bits |= 1 << i
+        elif cell == "O":
+            o_bits |= 1 << i
+    return x_bits, o_bits
+
+
+def create_board() -> list:
+    return [" " for _ in range(CELLS)]
+
+
+def is_win(bits: int) -> bool:
+    return any(bits & bits >> step & bits >> 2 * step & bits >> 3 * step & start for step, start in DIRECTIONS)
+
+
+def wins_with(bits: int, cell: int) -> bool:
+    # Достаточно проверить линии через последнюю занятую клетку
+    return any(bits & line == line for line in CELL_LINES[cell])
+
+
+def check_winner(board: list, player: str) -> bool:
+    x_bits, o_bits = to_bitboards(board)
+    return is_win(x_bits if player == "X" else o_bits)
+
+
+def threats(own: int, opp: int) -> int:
+    # Маска клеток, где у own три в линии и четвёртая клетка свободна
+    result = 0
+    for line in LINES:
+        if not opp & line:
+            rest = line & ~own
+            if rest and not rest & (rest - 1):
+                result |= rest
+    return result
+
+
+def _iter_bits(bits: int):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def evaluate(own: int, opp: int) -> int:
+    score = 0
+    for line in LINES:
+        if not opp & line:
+            score += LINE_WEIGHTS[(own & line).bit_count()]
+        elif not own & line:
+            score -= LINE_WEIGHTS[(opp & line).bit_count()]
+    return score
+
+
+def play(own: int, opp: int, cell: int) -> tuple[int, int]:
+    # Ход own в cell меняет только линии через cell: новые угрозы own и прирост evaluate(own, opp).
+    # Угрозы opp на этих линиях сводились к самой cell, поэтому их достаточно снять маской клетки
+    new_own = own | 1 << cell
+    added = 0
+    delta = 0
+    for line in CELL_LINES[cell]:
+        if opp & line:
+            if not own & line:
+                delta += LINE_WEIGHTS[(opp & line).bit_count()]
+            continue
+        count = (own & line).bit_count()
+        delta += LINE_WEIGHTS[count + 1] - LINE_WEIGHTS[count]
+        rest = line & ~new_own
+        if rest and not rest & (rest - 1):
+            added |= rest
+    return added, delta
+
+
+class _Search:
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.nodes = 0
+        self.cutoffs = 0
+        self.tt_hits = 0
+        self.table = {}
+
+    def ordered_moves(self, own: int, opp: int, own_threats: int, opp_threats: int, best: int | None) -> list:
+        free = ~(own | opp) & FULL_MASK
+        # Вынужденный ход: у соперника есть угроза - только блокировка
+        if opp_threats:
+            return list(_iter_bits(opp_threats))
+        moves = [cell for cell in CELL_ORDER if free >> cell & 1]
+        if own_threats:
+            moves.sort(key=lambda cell: not own_threats >> cell & 1)
+        if best is not None and best in moves:
+            moves.remove(best)
+            moves.insert(0, best)
+        return moves
+
+    def negamax(self, own: int, opp: int, own_threats: int, opp_threats: int, score: int,
+                depth: int, alpha: float, beta: float) -> float:
+        # Угрозы (свободные клетки) и score = evaluate(own, opp) обновляются по ходу в play()
+        self.nodes += 1
+        if self.nodes % _CHECK_EVERY == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if not ~(own | opp) & FULL_MASK:
+            return 0
+        # Своя угроза = выигрыш следующим ходом
+        if own_threats:
+            return WIN_SCORE + depth
+        if depth <= 0:
+            return score
+
+        key = (own, opp)
+        entry = self.table.get(key)
+        best_move = None
+        if entry is not None:
+            self.tt_hits += 1
+            entry_depth, value, flag, best_move = entry
+            if entry_depth >= depth:
+                if flag == 0:
+                    return value
+                if flag == 1 and value >= beta:
+                    return value
+                if flag == 2 and value <= alpha:
+                    return value
+
+        alpha_orig = alpha
+        best = -float("inf")
+        moves = self.ordered_moves(own, opp, own_threats, opp_threats, best_move)
+        # Блокировка не тратит глубину: форсированные цепочки просматриваются до конца
+        next_depth = depth if len(moves) == 1 else depth - 1
+        for move in moves:
+            value = -self.child(own, opp, own_threats, opp_threats, score, move, next_depth, -beta, -alpha)
+            if value > best:
+                best = value
+                best_move = move
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                self.cutoffs += 1
+                break
+        flag = 1 if best >= beta else 2 if best <= alpha_orig else 0
+        self.table[key] = (depth, best, flag, best_move)
+        return best
+
+    def child(self, own: int, opp: int, own_threats: int, opp_threats: int, score: int,
+              move: int, depth: int, alpha: float, beta: float) -> float:
+        # Позиция после хода own в move, с точки зрения соперника
+        added, delta = play(own, opp, move)
+        bit = 1 << move
+        return self.negamax(opp, own | bit, opp_threats & ~bit, own_threats & ~bit | added, -(score + delta),
+                            depth, alpha, beta)
+
+
+def best_move(board: list, player: str, time_budget: float = 1.0, max_depth: int | None = None) -> int | None:
+    x_bits, o_bits = to_bitboards(board)
+    own, opp = (x_bits, o_bits) if player == "X" else (o_bits, x_bits)
+    free = ~(own | opp) & FULL_MASK
+    if not free:
+        return None
+    own_threats = threats(own, opp)
+    if own_threats:
+        return next(_iter_bits(own_threats))
+
+    search = _Search(time.perf_counter() + time_budget)
+    opp_threats = threats(opp, own)
+    score = evaluate(own, opp)
+    moves = search.ordered_moves(own, opp, own_threats, opp_threats, None)
+    if len(moves) == 1:
+        return moves[0]
+    best = moves[0]
+    depth = 0
+    limit = max_depth or free.bit_count()
+    # Итеративное углубление с таблицей транспозиций, общей для всех итераций
+    for depth in range(1, limit + 1):
+        alpha = -float("inf")
+        current = moves[0]
+        try:
+            for move in moves:
+                value = -search.child(own, opp, own_threats, opp_threats, score, move, depth - 1, -float("inf"), -alpha)
+                if value > alpha:
+                    alpha = value
+                    current = move
+        except SearchTimeout:
+            depth -= 1
+            break
+        best = current
+        if abs(alpha) >= WIN_SCORE:
+            break
+        moves.remove(best)
+        moves.insert(0, best)
+    probe = search_stats.probe
+    if probe is not None:
+        probe.nodes += search.nodes
+        probe.cutoffs += search.cutoffs
+        probe.tt_hits += search.tt_hits
+        probe.max_depth = max(probe.max_depth, depth)
+    logger.debug(f"Qubic search: depth={depth}, nodes={search.nodes}, move={best}")
+    return best
+
+
+def ai_move(board: list, player: str, difficulty: str, time_budget: float | None = None) -> int | None:
+    limit, max_depth = DIFFICULTY_LIMITS.get(difficulty, DIFFICULTY_LIMITS["medium"])
+    time_budget = limit if time_budget is None else min(limit, time_budget)
+    if difficulty == "easy" and random.random() < 0.5:
+        empty = [i for i, cell in enumerate(board) if cell == " "]
+        return random.choice(empty) if empty else None
+    return best_move(board, player, time_budget, max_depth)
+
+
+def render(board: list) -> str:
+    # Четыре слоя один под другим, клетки 1..64 как на клавиатуре
+    layers = []
+    for layer in range(SIZE):
+        rows = []
+        for row in range(SIZE):
+            start = layer * 16 + row * 4
+            rows.append(" | ".join(board[start + col] if board[start + col] != " " else "·" for col in range(SIZE)))
+        layers.append(f"{layer + 1}:\n" + "\n".join(rows))
+    return "\n\n".join(layers)
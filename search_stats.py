@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Включается переменной окружения SEARCH_STATS=1 (в том числе из .env - бот перечитывает её
+# в main() через enable()); флаг передаётся процессам пула вместе с задачей.
+enabled = os.getenv("SEARCH_STATS") == "1"
+
+# Верхние границы корзин гистограмм
+TIME_BUCKETS_MS = (0.01, 0.1, 1, 10, 100, 1000, 5000)
+NODE_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+# Зонд текущего вызова ai_move; None - замер выключен
+probe = None
+
+_histograms = {}
+
+
+class SearchProbe:
+    __slots__ = ("difficulty", "engine", "nodes", "cutoffs", "max_depth", "tt_hits", "wall_time")
+
+    def __init__(self, difficulty: str, engine: str):
+        self.difficulty = difficulty
+        self.engine = engine
+        self.nodes = 0
+        self.cutoffs = 0
+        self.max_depth = 0
+        self.tt_hits = 0
+        self.wall_time = 0.0
+
+    def sample(self) -> tuple:
+        return self.difficulty, self.engine, self.nodes, self.cutoffs, self.max_depth, self.tt_hits, self.wall_time
+
+
+def enable(value: bool = True):
+    global enabled
+    enabled = value
+
+
+def set_engine(engine: str):
+    if probe is not None:
+        probe.engine = engine
+
+
+@contextmanager
+def measure(difficulty: str, engine: str = "unknown", record_sample: bool = True):
+    global probe
+    if not enabled:
+        yield None
+        return
+    current = probe = SearchProbe(difficulty, engine)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.wall_time = time.perf_counter() - started
+        probe = None
+        if record_sample:
+            record(current.sample())
+
+
+def _histogram() -> dict:
+    return {
+        "calls": 0,
+        "nodes": 0,
+        "cutoffs": 0,
+        "tt_hits": 0,
+        "max_depth": 0,
+        "wall_time": 0.0,
+        "engines": {},
+        "time_ms": [0] * (len(TIME_BUCKETS_MS) + 1),
+        "nodes_per_call": [0] * (len(NODE_BUCKETS) + 1),
+    }
+
+
+def record(sample: tuple):
+    difficulty, engine, nodes, cutoffs, max_depth, tt_hits, wall_time = sample
+    histogram = _histograms.get(difficulty)
+    if histogram is None:
+        histogram = _histograms[difficulty] = _histogram()
+    histogram["calls"] += 1
+    histogram["nodes"] += nodes
+    histogram["cutoffs"] += cutoffs
+    histogram["tt_hits"] += tt_hits
+    histogram["max_depth"] = max(histogram["max_depth"], max_depth)
+    histogram["wall_time"] += wall_time
+    histogram["engines"][engine] = histogram["engines"].get(engine, 0) + 1
+    histogram["time_ms"][bisect_left(TIME_BUCKETS_MS, wall_time * 1000)] += 1
+    histogram["nodes_per_call"][bisect_left(NODE_BUCKETS, nodes)] += 1
+
+
+def dump() -> dict:
+    return {
+        "time_buckets_ms": list(TIME_BUCKETS_MS) + ["inf"],
+        "node_buckets": list(NODE_BUCKETS) + ["inf"],
+        "difficulties": _histograms,
+    }
+
+
+def log_dump():
+    logger.info(f"Search stats: {json.dumps(dump(), ensure_ascii=False)}")
+
+
+def reset():
+    _histograms.clear()
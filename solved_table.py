@@ -0,0 +1,298 @@
+import os
+import sys
+import math
+import mmap
+import random
+import struct
+import logging
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Solved-game table for classic 3x3: every position reachable from the empty
+# board (X moves first) with its game-theoretic value for the side to move,
+# the distance to the result in plies and the set of optimal moves.
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solved_table.bin")
+TABLE_MAGIC = b"TTT2"
+
+WIN_LINES = [(0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6)]
+POWERS = [3 ** i for i in range(9)]
+DIGITS = {" ": 0, "X": 1, "O": 2}
+SYMBOLS = (" ", "X", "O")
+
+POSITIONS = 3 ** 9
+
+# Файл - заголовок (магия, число достижимых позиций) и плотный массив uint32 (little-endian),
+# индекс - номер позиции в троичной системе. Запись: биты 0-7 - ценность + 1 (MISSING -
+# позиция недостижима), 8-15 - расстояние, 16-24 - маска лучших ходов.
+# Файл открывается через mmap: все процессы бота читают одну копию из кэша страниц.
+_HEADER = struct.Struct("<4sI")
+MISSING = 0xFF
+
+# Сложность 3x3 - температура мягкого максимума по ценности ходов: 0 - всегда лучший ход,
+# чем выше температура, тем чаще ИИ выбирает ничейный или проигрышный ход.
+# Подбирается по отчёту benchmarks/calibrate_difficulty.py
+DIFFICULTY_TEMPERATURE = {
+    "easy": 1.0,
+    "medium": 0.3,
+    "hard": 0.0,
+}
+
+Solution = namedtuple("Solution", ["value", "distance", "moves"])
+# Ценность хода для стороны на ходу: +1 выигрыш, 0 ничья, -1 проигрыш; distance - полуходов до результата
+MoveValue = namedtuple("MoveValue", ["value", "distance"])
+
+_table = None
+
+
+class SolvedTable:
+    __slots__ = ("records", "count", "_mmap")
+
+    def __init__(self, records: memoryview, count: int, mapped: mmap.mmap | None = None):
+        self.records = records
+        self.count = count
+        self._mmap = mapped
+
+    def get(self, code: int, default=None) -> "Solution | None":
+        if not 0 <= code < POSITIONS:
+            return default
+        record = self.records[code]
+        if record & 0xFF == MISSING:
+            return default
+        return Solution((record & 0xFF) - 1, record >> 8 & 0xFF, MASK_MOVES[record >> 16])
+
+    def __contains__(self, code: int) -> bool:
+        return 0 <= code < POSITIONS and self.records[code] & 0xFF != MISSING
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self):
+        for code in range(POSITIONS):
+            solution = self.get(code)
+            if solution is not None:
+                yield code, solution
+
+    def close(self):
+        self.records.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+
+def encode_board(board: list) -> int:
+    return sum(DIGITS[cell] * POWERS[i] for i, cell in enumerate(board))
+
+
+def decode_board(code: int) -> list:
+    board = []
+    for _ in range(9):
+        code, digit = divmod(code, 3)
+        board.append(SYMBOLS[digit])
+    return board
+
+
+def _winner(board: list) -> str | None:
+    for a, b, c in WIN_LINES:
+        if board[a] != " " and board[a] == board[b] == board[c]:
+            return board[a]
+    return None
+
+
+def _mask_to_moves(mask: int) -> tuple:
+    return tuple(i for i in range(9) if mask >> i & 1)
+
+
+# Кортежи ходов для всех масок: поиск в таблице не создаёт новых объектов ходов
+MASK_MOVES = tuple(_mask_to_moves(mask) for mask in range(1 << 9))
+
+
+def move_key(value: int, distance: int) -> tuple:
+    # Выигрыш - как можно быстрее, проигрыш - как можно дольше
+    return value, -distance if value > 0 else distance
+
+
+def build_table() -> dict:
+    # Прямой проход: все достижимые позиции по слоям (номер слоя = число ходов)
+    layers = [{0}]
+    for ply in range(9):
+        digit = 1 if ply % 2 == 0 else 2
+        layer = set()
+        for code in layers[ply]:
+            board = decode_board(code)
+            if _winner(board) is not None:
+                continue
+            for i in range(9):
+                if board[i] == " ":
+                    layer.add(code + digit * POWERS[i])
+        layers.append(layer)
+
+    # Ретроградный анализ: от заполненных досок к пустой
+    table = {}
+    for ply in range(9, -1, -1):
+        digit = 1 if ply % 2 == 0 else 2
+        for code in layers[ply]:
+            board = decode_board(code)
+            if _winner(board) is not None:
+                # Предыдущий ход выиграл, сторона на ходу проиграла
+                table[code] = (-1, 0, 0)
+                continue
+            if ply == 9:
+                table[code] = (0, 0, 0)
+                continue
+            best_key = None
+            best_mask = 0
+            best_distance = 0
+            for i in range(9):
+                if board[i] != " ":
+                    continue
+                child_value, child_distance, _ = table[code + digit * POWERS[i]]
+                value = -child_value
+                distance = child_distance + 1
+                key = move_key(value, distance)
+                if best_key is None or key > best_key:
+                    best_key = key
+                    best_mask = 1 << i
+                    best_distance = distance
+                elif key == best_key:
+                    best_mask |= 1 << i
+            table[code] = (best_key[0], best_distance, best_mask)
+    logger.debug(f"Solved table built: {len(table)} positions")
+    return table
+
+
+def pack_table(table: dict) -> bytes:
+    records = array("I", [MISSING]) * POSITIONS
+    for code, (value, distance, mask) in table.items():
+        records[code] = mask << 16 | distance << 8 | (value + 1)
+    if sys.byteorder != "little":
+        records.byteswap()
+    return _HEADER.pack(TABLE_MAGIC, len(table)) + records.tobytes()
+
+
+def save_table(table: dict, path: str = TABLE_FILE):
+    with open(path, "wb") as f:
+        f.write(pack_table(table))
+
+
+def _records(buffer) -> memoryview:
+    records = memoryview(buffer)[_HEADER.size:]
+    if sys.byteorder == "little":
+        return records.cast("I")
+    # На big-endian платформах без копии не обойтись
+    swapped = array("I", records.tobytes())
+    swapped.byteswap()
+    return memoryview(swapped)
+
+
+def _check_header(buffer, path: str) -> int:
+    magic, count = _HEADER.unpack_from(buffer)
+    if magic != TABLE_MAGIC or len(buffer) != _HEADER.size + POSITIONS * 4:
+        raise ValueError(f"Corrupted solved table file: {path}")
+    return count
+
+
+def read_table(path: str = TABLE_FILE) -> SolvedTable:
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        count = _check_header(mapped, path)
+    except (ValueError, struct.error):
+        mapped.close()
+        raise ValueError(f"Corrupted solved table file: {path}")
+    return SolvedTable(_records(mapped), count, mapped)
+
+
+def load_table(path: str = TABLE_FILE) -> SolvedTable:
+    global _table
+    if _table is None:
+        try:
+            _table = read_table(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Solved table unavailable ({e}), rebuilding {path}")
+            data = pack_table(build_table())
+            try:
+                with open(path, "wb") as f:
+                    f.write(data)
+                _table = read_table(path)
+            except (OSError, ValueError) as e:
+                # Файл не записать - держим таблицу в памяти процесса
+                logger.error(f"Failed to save solved table to {path}: {e}")
+                _table = SolvedTable(_records(data), _check_header(data, path))
+    return _table
+
+
+def position_code(board: list, player: str) -> int | None:
+    # Таблица построена для партий, где X ходит первым. Партии, начатые O,
+    # сводятся к ним заменой X <-> O: ценность для стороны на ходу не меняется.
+    x_count = board.count("X")
+    o_count = board.count("O")
+    if (player == "X" and x_count == o_count) or (player == "O" and x_count == o_count + 1):
+        return encode_board(board)
+    if (player == "O" and o_count == x_count) or (player == "X" and o_count == x_count + 1):
+        return sum((0, 2, 1)[DIGITS[cell]] * POWERS[i] for i, cell in enumerate(board))
+    return None
+
+
+def lookup(board: list, player: str) -> Solution | None:
+    if len(board) != 9:
+        return None
+    code = position_code(board, player)
+    if code is None:
+        return None
+    return load_table().get(code)
+
+
+@lru_cache(maxsize=None)
+def _move_values(code: int) -> tuple | None:
+    # Позиций всего 5478, поэтому кэш не ограничен
+    table = load_table()
+    solution = table.get(code)
+    if solution is None:
+        return None
+    board = decode_board(code)
+    if not solution.moves:
+        # Партия окончена: ходов нет
+        return tuple(None for _ in board)
+    digit = 1 if board.count("X") == board.count("O") else 2
+    values = []
+    for i, cell in enumerate(board):
+        child = table.get(code + digit * POWERS[i]) if cell == " " else None
+        values.append(None if child is None else MoveValue(-child.value, child.distance + 1))
+    return tuple(values)
+
+
+def move_values(board: list, player: str) -> tuple | None:
+    # Ценность каждой из 9 клеток за один проход; None - клетка занята или партия окончена
+    if len(board) != 9:
+        return None
+    code = position_code(board, player)
+    if code is None:
+        return None
+    return _move_values(code)
+
+
+def best_moves(values: tuple) -> tuple:
+    keys = {i: move_key(*value) for i, value in enumerate(values) if value is not None}
+    if not keys:
+        return ()
+    best = max(keys.values())
+    return tuple(i for i, key in keys.items() if key == best)
+
+
+def sample_move(values: tuple, temperature: float, rng=random) -> int | None:
+    moves = [i for i, value in enumerate(values) if value is not None]
+    if not moves:
+        return None
+    if temperature <= 0:
+        return rng.choice(best_moves(values))
+    weights = [math.exp(values[i].value / temperature) for i in moves]
+    return rng.choices(moves, weights)[0]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    table = build_table()
+    save_table(table)
+    logger.info(f"Saved {len(table)} positions to {TABLE_FILE} ({os.path.getsize(TABLE_FILE)} bytes)")
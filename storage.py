@@ -0,0 +1,597 @@
+import json
+import math
+import time
+import asyncio
+import sqlite3
+import logging
+import itertools
+import threading
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = "game.db"
+SCHEMA_FILE = "database.sql"
+
+# WAL: читатели не блокируют писателя; synchronous=NORMAL в режиме WAL не делает fsync
+# на каждый коммит, при сбое питания теряются только последние транзакции
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Версия схемы в PRAGMA user_version; миграция N переводит базу из версии N-1 в N
+SCHEMA_VERSION = 2
+
+# Тексты запросов постоянны: sqlite3 держит подготовленные выражения в кэше соединения
+SAVE_STATE_SQL = """
+    INSERT OR REPLACE INTO game_state (user_id, board, move_count, mode, symbols)
+    VALUES (?, ?, ?, ?, ?)
+"""
+LOAD_STATE_SQL = "SELECT board, move_count FROM game_state WHERE user_id = ?"
+CLEAR_STATE_SQL = "DELETE FROM game_state WHERE user_id = ?"
+# История только дописывается; повтор той же пачки после сбоя ничего не меняет
+INSERT_MOVE_SQL = "INSERT OR IGNORE INTO moves (game_id, ply, cell, symbol) VALUES (?, ?, ?, ?)"
+INSERT_GAME_SQL = """
+    INSERT OR IGNORE INTO games (game_id, user_id, cells, mode, symbols, result, moves, started_at, ended_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+LAST_GAME_ID_SQL = "SELECT max(ifnull((SELECT max(game_id) FROM games), 0), ifnull((SELECT max(game_id) FROM moves), 0))"
+LOAD_GAME_SQL = "SELECT game_id, user_id, cells, mode, symbols, result, moves, started_at, ended_at FROM games WHERE game_id = ?"
+LOAD_MOVES_SQL = "SELECT ply, cell, symbol FROM moves WHERE game_id = ? ORDER BY ply"
+# Счётчики прибавляются в базе атомарно: строка - приращения за пачку
+UPSERT_STATS_SQL = """
+    INSERT INTO game_stats (user_id, difficulty, wins, losses, draws) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, difficulty) DO UPDATE SET
+        wins = wins + excluded.wins, losses = losses + excluded.losses, draws = draws + excluded.draws
+"""
+LOAD_STATS_SQL = "SELECT difficulty, wins, losses, draws FROM game_stats WHERE user_id = ?"
+
+# Компактная строка game_state. Доска - BLOB: первый байт - число клеток (0 - Ultimate),
+# дальше доска как число в троичной системе (" "=0, "X"=1, "O"=2), big-endian.
+# Ultimate хранит число из своей текстовой кодировки "u:<hex>" (ultimate.PREFIX).
+# Режим и сложность - одно число (индекс + 1, 0 - не задано), роли X/O - по 2 бита.
+ULTIMATE_PREFIX = "u:"
+GAME_MODES = ("player_vs_ai", "ai_vs_player", "ai_vs_ai", "classic_mode", "ultimate_mode", "qubic_mode")
+DIFFICULTIES = ("easy", "medium", "hard")
+SYMBOL_FIELDS = ("human_player", "ai_player", "ai1_symbol", "ai2_symbol", "player1_symbol", "player2_symbol")
+SYMBOLS = (None, "X", "O")
+# Итог партии в games.result: победитель - как в SYMBOLS, брошенная партия - отдельный код
+RESULTS = ("draw", "X", "O", "abandoned")
+# Итог партии для игрока в game_stats, в порядке колонок
+OUTCOMES = ("win", "loss", "draw")
+# Ходы Ultimate - номер малой доски * 9 + клетка, при повторе это плоская доска из 81 клетки
+ULTIMATE_CELLS = 81
+
+_BOARD_DIGITS = str.maketrans(" XO", "012")
+# Пять клеток на шаг разбора: 3^5 = 243 вариантов
+_CHUNK = 5
+_CHUNK_CELLS = [
+    [" XO"[code // 3 ** i % 3] for i in range(_CHUNK - 1, -1, -1)] for code in range(3 ** _CHUNK)
+]
+_code_sizes = {}
+
+
+def _code_size(cells: int) -> int:
+    size = _code_sizes.get(cells)
+    if size is None:
+        size = _code_sizes[cells] = ((3 ** cells - 1).bit_length() + 7) // 8
+    return size
+
+
+def encode_board(board) -> bytes:
+    if isinstance(board, str):
+        if not board.startswith(ULTIMATE_PREFIX):
+            raise ValueError(f"Unknown board encoding: {board!r}")
+        number = int(board[len(ULTIMATE_PREFIX):], 16)
+        return b"\x00" + number.to_bytes((number.bit_length() + 7) // 8, "big")
+    cells = len(board)
+    if not 0 < cells < 256:
+        raise ValueError(f"Unsupported board size: {cells}")
+    code = int("".join(board).translate(_BOARD_DIGITS), 3)
+    return bytes((cells,)) + code.to_bytes(_code_size(cells), "big")
+
+
+def decode_board(data: bytes):
+    cells = data[0]
+    number = int.from_bytes(data[1:], "big")
+    if cells == 0:
+        return ULTIMATE_PREFIX + format(number, "x")
+    if len(data) - 1 != _code_size(cells):
+        raise ValueError(f"Corrupt board of {cells} cells")
+    # Младшие разряды - последние клетки: разбираем с конца по 5 клеток
+    steps, rest = divmod(cells, _CHUNK)
+    parts = []
+    for _ in range(steps):
+        number, code = divmod(number, 3 ** _CHUNK)
+        parts.append(_CHUNK_CELLS[code])
+    if number >= 3 ** rest:
+        raise ValueError(f"Corrupt board of {cells} cells")
+    if rest:
+        parts.append(_CHUNK_CELLS[number][_CHUNK - rest:])
+    return [cell for part in reversed(parts) for cell in part]
+
+
+def pack_mode(game_mode: str | None, difficulty: str | None) -> int:
+    mode = GAME_MODES.index(game_mode) + 1 if game_mode in GAME_MODES else 0
+    return mode | difficulty_code(difficulty) << 4
+
+
+def unpack_mode(packed: int) -> tuple:
+    mode, level = packed & 0xF, packed >> 4
+    return GAME_MODES[mode - 1] if mode else None, DIFFICULTIES[level - 1] if level else None
+
+
+def pack_symbols(user_data: dict) -> int:
+    packed = 0
+    for i, field in enumerate(SYMBOL_FIELDS):
+        symbol = user_data.get(field)
+        if symbol in SYMBOLS:
+            packed |= SYMBOLS.index(symbol) << 2 * i
+    return packed
+
+
+def unpack_symbols(packed: int) -> dict:
+    return {field: SYMBOLS[packed >> 2 * i & 3] for i, field in enumerate(SYMBOL_FIELDS)}
+
+
+def state_row(user_id: int, board, move_count: int, user_data: dict) -> tuple:
+    return (
+        user_id,
+        encode_board(board),
+        move_count,
+        pack_mode(user_data.get("game_mode"), user_data.get("difficulty")),
+        pack_symbols(user_data),
+    )
+
+
+def move_row(game_id: int, ply: int, cell: int, symbol: str) -> tuple:
+    return game_id, ply, cell, SYMBOLS.index(symbol)
+
+
+def new_game_record(game_id: int, user_id: int, cells: int, user_data: dict, started_at: int) -> dict:
+    # Описание партии запоминается при старте: к концу партии user_data может смениться новой игрой
+    return {
+        "game_id": game_id,
+        "user_id": user_id,
+        "cells": cells,
+        "mode": pack_mode(user_data.get("game_mode"), user_data.get("difficulty")),
+        "symbols": pack_symbols(user_data),
+        "moves": 0,
+        "started_at": started_at,
+    }
+
+
+def game_row(record: dict, result: str, ended_at: int) -> tuple:
+    return (
+        record["game_id"],
+        record["user_id"],
+        record["cells"],
+        record["mode"],
+        record["symbols"],
+        RESULTS.index(result),
+        record["moves"],
+        record["started_at"],
+        ended_at,
+    )
+
+
+def difficulty_code(difficulty: str | None) -> int:
+    return DIFFICULTIES.index(difficulty) + 1 if difficulty in DIFFICULTIES else 0
+
+
+def replay(cells: int, moves: list) -> list:
+    # Доски после каждого хода партии; moves - строки (ply, cell, symbol) из таблицы moves
+    board = [" "] * (cells or ULTIMATE_CELLS)
+    boards = []
+    for _, cell, symbol in moves:
+        board[cell] = SYMBOLS[symbol]
+        boards.append(list(board))
+    return boards
+
+
+def _migrate_compact_state(conn: sqlite3.Connection):
+    # 0 -> 1: game_state с JSON-доской и текстовыми колонками -> компактная строка
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(game_state)")]
+    if "game_mode" not in columns:
+        return
+    conn.execute("ALTER TABLE game_state RENAME TO game_state_v0")
+    conn.execute("""
+        CREATE TABLE game_state (
+            user_id INTEGER PRIMARY KEY,
+            board BLOB NOT NULL,
+            move_count INTEGER NOT NULL,
+            mode INTEGER NOT NULL DEFAULT 0,
+            symbols INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    rows = []
+    skipped = 0
+    legacy = conn.execute(f"SELECT user_id, board, move_count, {', '.join(('game_mode', 'difficulty') + SYMBOL_FIELDS)} FROM game_state_v0")
+    for user_id, board, move_count, game_mode, difficulty, *symbols in legacy:
+        try:
+            if not board.startswith(ULTIMATE_PREFIX):
+                board = json.loads(board)
+                if not isinstance(board, list) or not all(cell in (" ", "X", "O") for cell in board):
+                    raise ValueError("not a board")
+            user_data = dict(zip(SYMBOL_FIELDS, symbols), game_mode=game_mode, difficulty=difficulty)
+            rows.append(state_row(user_id, board, move_count, user_data))
+        except (ValueError, TypeError) as e:
+            skipped += 1
+            logger.warning(f"Dropping unreadable game_state row for user {user_id}: {e}")
+    conn.executemany(SAVE_STATE_SQL, rows)
+    conn.execute("DROP TABLE game_state_v0")
+    logger.info(f"Migrated {len(rows)} game_state rows to compact encoding, dropped {skipped}")
+
+
+def _migrate_stats_by_difficulty(conn: sqlite3.Connection):
+    # 1 -> 2: game_stats(user_id, wins, losses, draws) -> счётчики по пользователю и сложности;
+    # старые счётчики переносятся с неизвестной сложностью (0)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(game_stats)")]
+    if not columns or "difficulty" in columns:
+        return
+    conn.execute("ALTER TABLE game_stats RENAME TO game_stats_v1")
+    conn.execute("""
+        CREATE TABLE game_stats (
+            user_id INTEGER NOT NULL,
+            difficulty INTEGER NOT NULL,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            draws INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, difficulty)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO game_stats (user_id, difficulty, wins, losses, draws)
+        SELECT user_id, 0, ifnull(wins, 0), ifnull(losses, 0), ifnull(draws, 0) FROM game_stats_v1
+    """)
+    conn.execute("DROP TABLE game_stats_v1")
+
+
+MIGRATIONS = {
+    1: _migrate_compact_state,
+    2: _migrate_stats_by_difficulty,
+}
+
+
+class Storage:
+    def __init__(self, path: str = DB_FILE, cached_statements: int = 64):
+        self.path = path
+        self.cached_statements = cached_statements
+        self._conn = None
+        # Соединение общее для цикла событий и фоновых потоков записи
+        self._lock = threading.Lock()
+        self._game_ids = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=5.0,
+                isolation_level=None,  # каждый запрос - своя транзакция, явные - через BEGIN
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+            )
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._conn = conn
+            logger.info(f"Opened database {self.path}")
+        return self._conn
+
+    def init_schema(self, schema_file: str = SCHEMA_FILE):
+        with open(schema_file, "r") as f:
+            schema = f.read()
+        with self._lock:
+            conn = self.connect()
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            # Каждая миграция - отдельная транзакция вместе с новым номером версии
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                conn.execute("BEGIN")
+                try:
+                    MIGRATIONS[target](conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                logger.info(f"Database {self.path} migrated to schema version {target}")
+            conn.executescript(schema)
+
+    def save_state(self, row: tuple):
+        with self._lock:
+            self.connect().execute(SAVE_STATE_SQL, row)
+
+    def load_state(self, user_id: int) -> tuple | None:
+        with self._lock:
+            return self.connect().execute(LOAD_STATE_SQL, (user_id,)).fetchone()
+
+    def clear_state(self, user_id: int):
+        with self._lock:
+            self.connect().execute(CLEAR_STATE_SQL, (user_id,))
+
+    def load_game_ids(self):
+        # Бот работает в одном процессе (bot.lock): номера считаются в памяти от максимума в базе.
+        # Бот читает максимум при запуске в потоке, и next_game_id не ждёт блокировку пачек записи
+        with self._lock:
+            last = self.connect().execute(LAST_GAME_ID_SQL).fetchone()[0]
+        self._game_ids = itertools.count(last + 1)
+
+    def next_game_id(self) -> int:
+        if self._game_ids is None:
+            self.load_game_ids()
+        return next(self._game_ids)
+
+    def load_game(self, game_id: int) -> tuple:
+        # Строка games (None, если партия не закончена) и её ходы по порядку
+        with self._lock:
+            conn = self.connect()
+            return conn.execute(LOAD_GAME_SQL, (game_id,)).fetchone(), conn.execute(LOAD_MOVES_SQL, (game_id,)).fetchall()
+
+    def load_stats(self, user_id: int) -> dict:
+        with self._lock:
+            rows = self.connect().execute(LOAD_STATS_SQL, (user_id,)).fetchall()
+        return {difficulty: list(counts) for difficulty, *counts in rows}
+
+    def write_batch(self, rows: dict, moves: list = (), games: list = (), stats: list = ()):
+        # Пачка одной транзакцией: последние состояния {user_id: строка или None для удаления},
+        # новые строки истории и приращения статистики
+        saves = [row for row in rows.values() if row is not None]
+        deletes = [(user_id,) for user_id, row in rows.items() if row is None]
+        with self._lock:
+            conn = self.connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(SAVE_STATE_SQL, saves)
+                conn.executemany(CLEAR_STATE_SQL, deletes)
+                conn.executemany(INSERT_MOVE_SQL, moves)
+                conn.executemany(INSERT_GAME_SQL, games)
+                conn.executemany(UPSERT_STATS_SQL, stats)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                logger.info(f"Closed database {self.path}")
+
+
+class StatsCache:
+    # Статистика игроков в памяти: {user_id: {сложность: [победы, поражения, ничьи]}}.
+    # База читается один раз на пользователя, дальше счётчики меняются здесь одновременно
+    # с постановкой приращения в очередь записи, поэтому кэш не отстаёт от несброшенных пачек.
+    # Из цикла событий счётчики загружаются через load(), чтобы чтение не ждало сброс очереди
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self._users = {}
+
+    async def load(self, user_id: int) -> dict:
+        if user_id not in self._users:
+            stats = await asyncio.to_thread(self.storage.load_stats, user_id)
+            # Пока шло чтение, счётчики могли загрузить синхронно через get()
+            self._users.setdefault(user_id, stats)
+        return self._users[user_id]
+
+    def get(self, user_id: int) -> dict:
+        stats = self._users.get(user_id)
+        if stats is None:
+            stats = self._users[user_id] = self.storage.load_stats(user_id)
+        return stats
+
+    def add(self, user_id: int, difficulty: str | None, outcome: str) -> tuple:
+        # Возвращает строку приращения для record_game
+        code = difficulty_code(difficulty)
+        delta = [0, 0, 0]
+        delta[OUTCOMES.index(outcome)] = 1
+        counts = self.get(user_id).setdefault(code, [0, 0, 0])
+        counts[OUTCOMES.index(outcome)] += 1
+        return (user_id, code, *delta)
+
+
+_NOT_PENDING = object()
+
+
+class WriteBehind:
+    # Отложенная запись состояний: обработчики кладут последнее состояние пользователя в очередь,
+    # фоновая задача сбрасывает накопленное одной транзакцией в потоке. Повторные записи одного
+    # пользователя до сброса схлопываются. Сброс - по размеру пачки, по таймеру, сразу после
+    # конца партии (clear, record_game) и при остановке. Ходы и итоги партий не схлопываются,
+    # а дописываются в той же транзакции; приращения статистики складываются по пользователю
+    # и сложности. Без запущенной задачи запись идёт напрямую.
+    def __init__(self, storage: Storage, max_batch: int = 256, interval: float = 0.5):
+        self.storage = storage
+        self.max_batch = max_batch
+        self.interval = interval
+        self._pending = {}
+        self._flushing = {}
+        self._moves = []
+        self._games = []
+        self._stats = {}
+        self._wake = None
+        self._task = None
+        self._closing = False
+        self.writes = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.failures = 0
+        self.peak_depth = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Write-behind started: batch {self.max_batch}, interval {self.interval}s")
+
+    async def stop(self):
+        # Остановка дожидается сброса всего, что накопилось в очереди
+        if self._task is not None:
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+            logger.info(f"Write-behind stopped: {self.stats()}")
+
+    def save(self, user_id: int, row: tuple):
+        self._put(user_id, row)
+
+    def clear(self, user_id: int):
+        # Конец партии: удаление уходит в базу ближайшим сбросом, не дожидаясь таймера
+        self._put(user_id, None)
+        if self._wake is not None:
+            self._wake.set()
+
+    def record_move(self, row: tuple):
+        self.writes += 1
+        if self._task is None:
+            self.storage.write_batch({}, moves=[row])
+            return
+        self._moves.append(row)
+        self._queued()
+
+    def record_game(self, row: tuple, stats: tuple | None = None):
+        # Итог партии и приращение статистики (user_id, сложность, победы, поражения, ничьи)
+        # пишутся вместе; конец партии - как и clear, повод сбросить очередь сразу
+        self.writes += 1
+        if self._task is None:
+            self.storage.write_batch({}, games=[row], stats=[stats] if stats else [])
+            return
+        self._games.append(row)
+        if stats:
+            self._add_stats(stats[:2], stats[2:])
+        self._queued()
+        self._wake.set()
+
+    def load(self, user_id: int) -> tuple | None:
+        # Состояние из очереди новее, чем в базе
+        for queue in (self._pending, self._flushing):
+            row = queue.get(user_id, _NOT_PENDING)
+            if row is not _NOT_PENDING:
+                return None if row is None else (row[1], row[2])
+        return self.storage.load_state(user_id)
+
+    def _put(self, user_id: int, row: tuple | None):
+        self.writes += 1
+        if self._task is None:
+            self.storage.write_batch({user_id: row})
+            return
+        if user_id in self._pending:
+            self.coalesced += 1
+        self._pending[user_id] = row
+        self._queued()
+
+    def _add_stats(self, key: tuple, counts):
+        total = self._stats.setdefault(key, [0, 0, 0])
+        for i, count in enumerate(counts):
+            total[i] += count
+
+    def _depth(self) -> int:
+        return len(self._pending) + len(self._moves) + len(self._games) + len(self._stats)
+
+    def _queued(self):
+        depth = self._depth()
+        self.peak_depth = max(self.peak_depth, depth)
+        if depth >= self.max_batch:
+            self._wake.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+        await self._flush()
+
+    async def _flush(self):
+        # Вызывается только фоновой задачей, поэтому сбросы не пересекаются
+        if not self._depth():
+            return
+        self._flushing, self._pending = self._pending, {}
+        moves, self._moves = self._moves, []
+        games, self._games = self._games, []
+        stats, self._stats = self._stats, {}
+        rows = len(self._flushing) + len(moves) + len(games) + len(stats)
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.storage.write_batch, self._flushing, moves, games,
+                                    [(*key, *counts) for key, counts in stats.items()])
+        except Exception as e:
+            # Неудачная пачка возвращается в очередь, если пользователь не записал состояние новее
+            self.failures += 1
+            logger.error(f"Write-behind flush of {rows} rows failed: {e}")
+            for user_id, row in self._flushing.items():
+                self._pending.setdefault(user_id, row)
+            self._moves[:0] = moves
+            self._games[:0] = games
+            for key, counts in stats.items():
+                self._add_stats(key, counts)
+            if self._closing:
+                logger.error(f"Write-behind dropped {self._depth()} rows on shutdown")
+                self._pending.clear()
+                self._moves.clear()
+                self._games.clear()
+                self._stats.clear()
+        else:
+            latency = time.perf_counter() - started
+            self.flushes += 1
+            self.rows_flushed += rows
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+            logger.debug(f"Write-behind flushed {rows} rows in {latency:.4f}s")
+        finally:
+            self._flushing = {}
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._depth(),
+            "peak_queue_depth": self.peak_depth,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "failures": self.failures,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "avg_flush_latency": self.total_flush_latency / self.flushes if self.flushes else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    # python storage.py <game_id> - повтор партии из истории ходов
+    import sys
+    store = Storage()
+    game, moves = store.load_game(int(sys.argv[1]))
+    if game:
+        cells = game[2]
+        mode, difficulty = unpack_mode(game[3])
+        print(f"game {game[0]}, user {game[1]}, {mode}/{difficulty}, result: {RESULTS[game[5]]}, {game[6]} moves")
+    else:
+        # Партия не закончена: размер доски - наименьший квадрат, вмещающий все ходы
+        cells = (math.isqrt(max((cell for _, cell, _ in moves), default=0)) + 1) ** 2
+        print(f"game {sys.argv[1]} is not finished, {len(moves)} moves")
+    import qubic
+    import ultimate
+    for (ply, cell, symbol), board in zip(moves, replay(cells, moves)):
+        print(f"{ply}. {SYMBOLS[symbol]} -> {ultimate.cell_name(cell) if cells == 0 else cell + 1}")
+        if cells == 0:
+            # Ход Ultimate - малая доска * 9 + клетка; печатаем общую сетку 9x9
+            rows = [[board[ultimate.move_at(row, column)] for column in range(9)] for row in range(9)]
+        elif len(board) == qubic.CELLS:
+            print(qubic.render(board))
+            continue
+        else:
+            size = math.isqrt(len(board))
+            rows = [board[row * size:(row + 1) * size] for row in range(size)]
+        print("\n".join("".join(row).replace(" ", ".") for row in rows))
+    store.close()
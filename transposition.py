@@ -0,0 +1,144 @@
+import logging
+from collections import OrderedDict
+
+import search_stats
+from bitboard import FULL_MASK, check_winner
+
+logger = logging.getLogger(__name__)
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# 8 симметрий квадрата (группа D4): new_board[i] = board[perm[i]]
+SYMMETRIES = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8),  # тождественная
+    (6, 3, 0, 7, 4, 1, 8, 5, 2),  # поворот на 90
+    (8, 7, 6, 5, 4, 3, 2, 1, 0),  # поворот на 180
+    (2, 5, 8, 1, 4, 7, 0, 3, 6),  # поворот на 270
+    (2, 1, 0, 5, 4, 3, 8, 7, 6),  # отражение по вертикали
+    (6, 7, 8, 3, 4, 5, 0, 1, 2),  # отражение по горизонтали
+    (0, 3, 6, 1, 4, 7, 2, 5, 8),  # главная диагональ
+    (8, 5, 2, 7, 4, 1, 6, 3, 0),  # побочная диагональ
+)
+
+# _PERMUTED[s][bits] - 9-битная маска после применения симметрии s
+_PERMUTED = tuple(
+    tuple(sum(1 << i for i in range(9) if bits >> perm[i] & 1) for bits in range(FULL_MASK + 1))
+    for perm in SYMMETRIES
+)
+
+
+def canonical_key(x_bits: int, o_bits: int) -> int:
+    return min(table[x_bits] << 9 | table[o_bits] for table in _PERMUTED)
+
+
+class TranspositionTable:
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: int) -> tuple | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key: int, flag: int, value: float):
+        self.entries[key] = (flag, value)
+        self.entries.move_to_end(key)
+        # Вытесняем давно не использованные позиции (LRU)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Одна таблица на процесс: позиции, посчитанные для одного чата, ускоряют все остальные
+shared_table = TranspositionTable()
+
+
+def minimax(x_bits: int, o_bits: int, depth: int, is_maximizing: bool, player: str,
+            alpha: float = -float("inf"), beta: float = float("inf"),
+            table: TranspositionTable = shared_table) -> float:
+    # bitboard.minimax с таблицей транспозиций; оценка та же: +1 - победа O, -1 - победа X
+    probe = search_stats.probe
+    if probe is not None:
+        probe.nodes += 1
+        if depth > probe.max_depth:
+            probe.max_depth = depth
+    if check_winner(o_bits):
+        return 1
+    if check_winner(x_bits):
+        return -1
+    occupied = x_bits | o_bits
+    if occupied == FULL_MASK:
+        return 0
+
+    place_x = (player == "X") == is_maximizing
+    # Значение зависит не только от доски, но и от того, кто ходит и чья это сторона в поиске
+    key = canonical_key(x_bits, o_bits) << 2 | place_x << 1 | is_maximizing
+    entry = table.get(key)
+    if entry is not None:
+        if probe is not None:
+            probe.tt_hits += 1
+        flag, value = entry
+        if flag == EXACT:
+            return value
+        if flag == LOWER_BOUND:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+
+    alpha_orig, beta_orig = alpha, beta
+    best_score = -float("inf") if is_maximizing else float("inf")
+    free = ~occupied & FULL_MASK
+    while free:
+        bit = free & -free
+        free ^= bit
+        if place_x:
+            score = minimax(x_bits | bit, o_bits, depth + 1, not is_maximizing, player, alpha, beta, table)
+        else:
+            score = minimax(x_bits, o_bits | bit, depth + 1, not is_maximizing, player, alpha, beta, table)
+        if is_maximizing:
+            best_score = max(best_score, score)
+            alpha = max(alpha, best_score)
+        else:
+            best_score = min(best_score, score)
+            beta = min(beta, best_score)
+        if beta <= alpha:
+            if probe is not None:
+                probe.cutoffs += 1
+            break
+
+    if best_score <= alpha_orig:
+        table.store(key, UPPER_BOUND, best_score)
+    elif best_score >= beta_orig:
+        table.store(key, LOWER_BOUND, best_score)
+    else:
+        table.store(key, EXACT, best_score)
+    return best_score
@@ -0,0 +1,200 @@
+import logging
+
+import mcts
+from bitboard import FULL_MASK, check_winner
+
+logger = logging.getLogger(__name__)
+
+# Ultimate: 9 малых досок 3x3. Ход = номер малой доски * 9 + номер клетки в ней.
+# Клетка, в которую сходил игрок, задаёт малую доску для ответа соперника.
+PREFIX = "u:"
+ANY_SUB = -1
+COLUMNS = "ABCDEFGHI"
+
+# Бюджет по сложности: (число симуляций, секунд на ход) - ответ укладывается в ~1 секунду
+PLAYOUT_BUDGETS = {
+    "easy": (300, 0.3),
+    "medium": (1500, 0.6),
+    "hard": (20000, 0.9),
+}
+
+
+class UltimateState:
+    __slots__ = ("x", "o", "macro_x", "macro_o", "closed", "next_sub", "to_move", "winner")
+
+    def __init__(self):
+        self.x = [0] * 9
+        self.o = [0] * 9
+        self.macro_x = 0
+        self.macro_o = 0
+        self.closed = 0  # малые доски, которые выиграны или заполнены
+        self.next_sub = ANY_SUB
+        self.to_move = "X"
+        self.winner = None
+
+    def copy(self) -> "UltimateState":
+        state = UltimateState.__new__(UltimateState)
+        state.x = list(self.x)
+        state.o = list(self.o)
+        state.macro_x = self.macro_x
+        state.macro_o = self.macro_o
+        state.closed = self.closed
+        state.next_sub = self.next_sub
+        state.to_move = self.to_move
+        state.winner = self.winner
+        return state
+
+    def is_terminal(self) -> bool:
+        return self.winner is not None or self.closed == FULL_MASK
+
+    def open_subs(self) -> list:
+        if self.is_terminal():
+            return []
+        if self.next_sub != ANY_SUB:
+            return [self.next_sub]
+        return [sub for sub in range(9) if not self.closed >> sub & 1]
+
+    def legal_moves(self) -> list:
+        moves = []
+        for sub in self.open_subs():
+            free = ~(self.x[sub] | self.o[sub]) & FULL_MASK
+            while free:
+                bit = free & -free
+                free ^= bit
+                moves.append(sub * 9 + bit.bit_length() - 1)
+        return moves
+
+    def apply(self, move: int):
+        sub, cell = divmod(move, 9)
+        bit = 1 << cell
+        if self.to_move == "X":
+            self.x[sub] |= bit
+            if check_winner(self.x[sub]):
+                self.macro_x |= 1 << sub
+                self.closed |= 1 << sub
+                if check_winner(self.macro_x):
+                    self.winner = "X"
+            self.to_move = "O"
+        else:
+            self.o[sub] |= bit
+            if check_winner(self.o[sub]):
+                self.macro_o |= 1 << sub
+                self.closed |= 1 << sub
+                if check_winner(self.macro_o):
+                    self.winner = "O"
+            self.to_move = "X"
+        if self.x[sub] | self.o[sub] == FULL_MASK:
+            self.closed |= 1 << sub
+        self.next_sub = ANY_SUB if self.closed >> cell & 1 else cell
+
+    def rollout(self, rng) -> str | None:
+        while not self.is_terminal():
+            moves = self.legal_moves()
+            self.apply(moves[rng.randrange(len(moves))])
+        return self.winner
+
+    def key(self) -> tuple:
+        return tuple(self.x), tuple(self.o), self.next_sub, self.to_move
+
+    def cell(self, move: int) -> str:
+        sub, cell = divmod(move, 9)
+        if self.x[sub] >> cell & 1:
+            return "X"
+        if self.o[sub] >> cell & 1:
+            return "O"
+        return " "
+
+
+def encode(state: UltimateState) -> str:
+    # 9 x (9 бит X + 9 бит O), затем малая доска для ответа (4 бита) и очередь хода (1 бит)
+    number = 0
+    for sub in range(8, -1, -1):
+        number = number << 18 | state.x[sub] << 9 | state.o[sub]
+    number = number << 4 | (state.next_sub + 1)
+    number = number << 1 | (state.to_move == "O")
+    return PREFIX + format(number, "x")
+
+
+def decode(text: str) -> UltimateState:
+    if not text.startswith(PREFIX):
+        raise ValueError(f"Not an ultimate state: {text!r}")
+    number = int(text[len(PREFIX):], 16)
+    state = UltimateState()
+    state.to_move = "O" if number & 1 else "X"
+    number >>= 1
+    state.next_sub = (number & 0xF) - 1
+    number >>= 4
+    for sub in range(9):
+        state.o[sub] = number & FULL_MASK
+        state.x[sub] = number >> 9 & FULL_MASK
+        number >>= 18
+        if state.x[sub] & state.o[sub]:
+            raise ValueError(f"Invalid ultimate state: {text!r}")
+        if check_winner(state.x[sub]):
+            state.macro_x |= 1 << sub
+        elif check_winner(state.o[sub]):
+            state.macro_o |= 1 << sub
+        if state.macro_x >> sub & 1 or state.macro_o >> sub & 1 or state.x[sub] | state.o[sub] == FULL_MASK:
+            state.closed |= 1 << sub
+    if check_winner(state.macro_x):
+        state.winner = "X"
+    elif check_winner(state.macro_o):
+        state.winner = "O"
+    # Ответ возможен только на открытой малой доске (после хода в закрытую - на любой)
+    if state.next_sub != ANY_SUB and (not 0 <= state.next_sub < 9 or state.closed >> state.next_sub & 1):
+        raise ValueError(f"Invalid ultimate state: {text!r}")
+    return state
+
+
+def cell_name(move: int) -> str:
+    sub, cell = divmod(move, 9)
+    row = sub // 3 * 3 + cell // 3
+    column = sub % 3 * 3 + cell % 3
+    return f"{COLUMNS[column]}{row + 1}"
+
+
+def parse_cell(text: str) -> int | None:
+    text = text.strip().upper()
+    if len(text) != 2 or text[0] not in COLUMNS or not text[1].isdigit() or text[1] == "0":
+        return None
+    return move_at(int(text[1]) - 1, COLUMNS.index(text[0]))
+
+
+def move_at(row: int, column: int) -> int:
+    return (row // 3 * 3 + column // 3) * 9 + row % 3 * 3 + column % 3
+
+
+def render(state: UltimateState) -> str:
+    lines = ["    " + "   ".join(" ".join(COLUMNS[c:c + 3]) for c in range(0, 9, 3))]
+    for row in range(9):
+        if row and row % 3 == 0:
+            lines.append("    " + "-" * 6 + "+" + "-" * 7 + "+" + "-" * 6)
+        cells = [state.cell(move_at(row, column)) for column in range(9)]
+        cells = [cell if cell != " " else "·" for cell in cells]
+        lines.append(f"{row + 1}   " + " | ".join(" ".join(cells[c:c + 3]) for c in range(0, 9, 3)))
+    return "\n".join(lines)
+
+
+def _winning_move(state: UltimateState) -> int | None:
+    for move in state.legal_moves():
+        after = state.copy()
+        after.apply(move)
+        if after.winner is not None:
+            return move
+    return None
+
+
+# Отдельное дерево для Ultimate: поддеревья переиспользуются между ходами партии
+engine = mcts.MCTS()
+
+
+def ai_move(encoded: str, difficulty: str, time_budget: float | None = None) -> int | None:
+    state = decode(encoded)
+    if state.is_terminal():
+        return None
+    playouts, limit = PLAYOUT_BUDGETS.get(difficulty, PLAYOUT_BUDGETS["medium"])
+    time_budget = limit if time_budget is None else min(limit, time_budget)
+    move = _winning_move(state)
+    if move is not None:
+        return move
+    return engine.search(state, playouts=playouts, time_budget=time_budget)
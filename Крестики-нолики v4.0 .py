@@ -1,12 +1,13 @@
 import os
 import json
-import random
-import sqlite3
 import time
 import asyncio
 import logging
+import signal
 import sys
-from copy import deepcopy
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -17,6 +18,25 @@ from telegram.ext import (
 )
 from dotenv import load_dotenv
 from filelock import FileLock
+import solved_table
+import nxn_engine
+import engine_pool
+import ultimate
+import qubic
+import search_stats
+import i18n
+from storage import (
+    Storage, WriteBehind, StatsCache, decode_board, state_row, move_row, new_game_record, game_row,
+    unpack_mode, unpack_symbols, difficulty_code
+)
+from engine import (
+    create_board,
+    check_winner,
+    is_board_full,
+    ai_move,
+    best_hint,
+    update_stats,
+)
 
 def acquire_lock():
     lock = FileLock("bot.lock")
@@ -27,16 +47,15 @@ def acquire_lock():
         print("Error: Another bot instance is running. Exiting...")
         sys.exit(1)
 
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-
-if not BOT_TOKEN or not isinstance(BOT_TOKEN, str) or len(BOT_TOKEN.split(':')) != 2:
-    print("❌ Ошибка: Неверный или отсутствует BOT_TOKEN.")
-    sys.exit(1)
-else:
-    print(f"✅ Токен загружен: {BOT_TOKEN[:10]}...")
+def load_token() -> str:
+    load_dotenv()
+    token = os.getenv("BOT_TOKEN")
+    if not token or not isinstance(token, str) or len(token.split(':')) != 2:
+        print("❌ Ошибка: Неверный или отсутствует BOT_TOKEN.")
+        sys.exit(1)
+    print(f"✅ Токен загружен: {token[:10]}...")
+    return token
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 settings = {
@@ -47,225 +66,28 @@ settings = {
     "difficulty": "medium",
 }
 
-ai_memory = {}
-human_memory = {}
+# Пул процессов для тяжёлого поиска, чтобы не блокировать цикл событий
+search_pool = engine_pool.AsyncEngine()
+
+# Одно долгоживущее соединение с базой (WAL) вместо открытия файла на каждый ход
+storage = Storage()
+# Ходы пишутся в базу пачками в фоне, повторные записи одного пользователя схлопываются
+board_writer = WriteBehind(storage)
+# Статистика для кнопки «Профиль»: читается из базы один раз на пользователя
+player_stats = StatsCache(storage)
+
 ai_logs = []
-stats = {
-    "AI": {"wins": 0, "losses": 0, "draws": 0},
-    "Human": {"wins": 0, "losses": 0, "draws": 0},
-}
 
-translations = {
-    "ru": {
-        "welcome_message": "Добро пожаловать в Крестики-Нолики! 🎮\nВыберите язык:",
-        "game_start": "Игра начинается! Вы - {player}, ИИ - {opponent}. Ваш ход!",
-        "invalid_move": "Неверный ход!.",
-        "player_wins": "{player} побеждает! 🏆",
-        "draw": "Ничья! 🤝",
-        "play_again": "Сыграть еще?",
-        "yes_button": "Да",
-        "no_button": "Нет",
-        "game_exit": "Игра завершена. До встречи! 👋",
-        "difficulty_prompt": "Выберите сложность",
-        "invalid_difficulty": "Неверная сложность. Используйте: easy, medium, hard",
-        "difficulty_set": "Сложность установлена: {difficulty}",
-        "language_prompt": "Выберите язык",
-        "language_set": "Язык установлен: {language}",
-        "ai_move": "ИИ ({player}) ходит на позицию {move}.",
-        "settings_menu": "Выберите настройку",
-        "ai_thinking": "ИИ думает...",
-        "game_mode_prompt": "Выберите режим игры:",
-        "classic_mode": "Классическая игра",
-        "player_vs_ai": "Игрок против ИИ",
-        "ai_vs_player": "ИИ против игрока",
-        "ai_vs_ai": "ИИ против ИИ",
-        "tic_tac_toe_web3": "Tic Tac Toe Web3",
-        "choose_symbol": "Выберите символ (X или O):",
-        "error_message": "Ошибка! Доска не обновлена. Перезапустите игру (/restart).",
-        "invalid_symbol": "Неверный символ. Используйте: X или O",
-        "return_to_menu": "Вернуться в меню",
-        "main_menu": "Главное меню",
-        "play_again_or_menu": "Хотите сыграть еще раз или вернуться в меню?",
-        "play_button": "Играть",
-        "profile_button": "Профиль",
-        "info_button": "Инфо",
-        "feature_coming_soon": "Функция скоро появится",
-        "game_over_returning": "Игра окончена. Возвращаемся в меню.",
-        "symbol_assigned": "Вам назначен символ: {symbol}",
-        "game_restarted": "Игра перезапущена! Выберите язык:",
-        "human_move": "Ваш ход",
-        "your_turn": "Ваш ход",
-    },
-    "en": {
-        "welcome_message": "Welcome to Tic-Tac-Toe! 🎮\nChoose a language:",
-        "game_start": "Game starts! You are {player}, AI is {opponent}. Your turn!",
-        "invalid_move": "Invalid move!.",
-        "player_wins": "{player} wins! 🏆",
-        "draw": "It's a draw! 😊",
-        "play_again": "Play again?",
-        "yes_button": "Yes",
-        "no_button": "No",
-        "game_exit": "Game over! See you next time! 😊",
-        "difficulty_prompt": "Choose difficulty:",
-        "invalid_difficulty": "Invalid difficulty! Use: easy, medium, hard",
-        "difficulty_set": "Difficulty set: {difficulty}",
-        "language_prompt": "Choose a language:",
-        "language_set": "Language set: to {language}",
-        "ai_move": "AI ({player}) moves to position {move}.",
-        "settings_menu": "Select a setting:",
-        "ai_thinking": "AI is thinking...",
-        "game_mode_prompt": "Choose a game mode:",
-        "classic_mode": "Classic Game",
-        "player_vs_ai": "Player vs AI",
-        "ai_vs_player": "AI vs Player",
-        "ai_vs_ai": "AI vs AI",
-        "tic_tac_toe_web3": "Tic Tac Toe Web3",
-        "choose_symbol": "Choose symbol (X or O):",
-        "error_message": "Error! Board not showing? Restart the game (/restart).",
-        "invalid_symbol": "Invalid symbol! Use: X или O",
-        "return_to_menu": "Return to menu",
-        "main_menu": "Main Menu",
-        "play_again_or_menu": "Do you want to play again or return to menu?",
-        "play_button": "Play",
-        "profile_button": "Profile",
-        "info_button": "Info",
-        "feature_coming_soon": "Feature coming soon",
-        "game_over_returning": "Game over. Returning to menu.",
-        "symbol_assigned": "You have been assigned symbol: {symbol}",
-        "game_restarted": "Game restarted! Choose a language:",
-        "human_move": "Your move",
-        "your_turn": "Your turn",
-    },
-    "ja": {
-        "welcome_message": "チックタックトーへようこそ！🎮\n言語を選択してください：",
-        "game_start": "ゲームが始まります！あなたは{player}、AIは{opponent}です。あなたのターン！",
-        "invalid_move": "無効な手です！。",
-        "player_wins": "{player}の勝利！🏆",
-        "draw": "引き分け！🤝",
-        "play_again": "もう一度プレイしますか？",
-        "yes_button": "はい",
-        "no_button": "いいえ",
-        "game_exit": "ゲーム終了！またね！👋",
-        "difficulty_prompt": "難易度を選択してください",
-        "invalid_difficulty": "無効な難易度です。easy、medium、hardを使用してください",
-        "difficulty_set": "難易度が{difficulty}に設定されました",
-        "language_prompt": "言語を選択してください",
-        "language_set": "言語が{language}に設定されました",
-        "ai_move": "AI（{player}）が位置{move}に手を打ちました。",
-        "settings_menu": "設定を選択してください",
-        "ai_thinking": "AIが考え中...",
-        "game_mode_prompt": "ゲームモードを選択してください：",
-        "classic_mode": "クラシックゲーム",
-        "player_vs_ai": "プレイヤー対AI",
-        "ai_vs_player": "AI対プレイヤー",
-        "ai_vs_ai": "AI対AI",
-        "tic_tac_toe_web3": "Tic Tac Toe Web3 ゲーム",
-        "choose_symbol": "シンボルを選択してください（XまたはO）：",
-        "error_message": "エラー！ボードが更新されていません。ゲームを再起動してください（/restart）。",
-        "invalid_symbol": "無効なシンボルです。XまたはOを使用してください",
-        "return_to_menu": "メニューに戻る",
-        "main_menu": "メインメニュー",
-        "play_again_or_menu": "もう一度プレイしますか、それともメニューに戻りますか？",
-        "play_button": "プレイ",
-        "profile_button": "プロフィール",
-        "info_button": "情報",
-        "feature_coming_soon": "機能は近日公開予定です",
-        "game_over_returning": "ゲーム終了。メニューに戻ります。",
-        "symbol_assigned": "あなたに割り当てられたシンボル：{symbol}",
-        "game_restarted": "ゲームが再起動されました！言語を選択してください：",
-        "human_move": "あなたの動き",
-        "your_turn": "あなたのターン",
-    },
-    "it": {
-        "welcome_message": "Benvenuto a Tris! 🎮\nScegli una lingua:",
-        "game_start": "La partita inizia! Sei {player}, l'IA è {opponent}. Tocca a te!",
-        "invalid_move": "Mossa non valida!.",
-        "player_wins": "{player} vince! 🏆",
-        "draw": "Pareggio! 🤝",
-        "play_again": "Giocare di nuovo?",
-        "yes_button": "Sì",
-        "no_button": "No",
-        "game_exit": "Partita terminata! A presto! 👋",
-        "difficulty_prompt": "Scegli la difficoltà",
-        "invalid_difficulty": "Difficoltà non valida. Usa: easy, medium, hard",
-        "difficulty_set": "Difficoltà impostata: {difficulty}",
-        "language_prompt": "Scegli una lingua",
-        "language_set": "Lingua impostata: {language}",
-        "ai_move": "L'IA ({player}) muove alla posizione {move}.",
-        "settings_menu": "Seleziona un'impostazione",
-        "ai_thinking": "L'IA sta pensando...",
-        "game_mode_prompt": "Scegli una modalità di gioco:",
-        "classic_mode": "Gioco Classico",
-        "player_vs_ai": "Giocatore contro IA",
-        "ai_vs_player": "IA contro Giocatore",
-        "ai_vs_ai": "IA contro IA",
-        "tic_tac_toe_web3": "Tic Tac Toe Web3",
-        "choose_symbol": "Scegli un simbolo (X o O):",
-        "error_message": "Errore! La scacchiera non si aggiorna? Riavvia il gioco (/restart).",
-        "invalid_symbol": "Simbolo non valido. Usa: X o O",
-        "return_to_menu": "Torna al menu",
-        "main_menu": "Menu Principale",
-        "play_again_or_menu": "Vuoi giocare di nuovo o tornare al menu?",
-        "play_button": "Gioca",
-        "profile_button": "Profilo",
-        "info_button": "Info",
-        "feature_coming_soon": "Funzionalità in arrivo",
-        "game_over_returning": "Partita finita. Torniamo al menu.",
-        "symbol_assigned": "Ti è stato assegnato il simbolo: {symbol}",
-        "game_restarted": "Partita riavviata! Scegli una lingua:",
-        "human_move": "La tua mossa",
-        "your_turn": "Tocca a te",
-    },
-    "hi": {
-        "welcome_message": "टिक-टैक-टो में आपका स्वागत है! 🎮\nएक भाषा चुनें:",
-        "game_start": "खेल शुरू होता है! आप {player} हैं, AI {opponent} है। आपकी बारी!",
-        "invalid_move": "अमान्य चाल!",
-        "player_wins": "{player} जीता! 🏆",
-        "draw": "ड्रॉ! 🤝",
-        "play_again": "फिर से खेलें?",
-        "yes_button": "हाँ",
-        "no_button": "नहीं",
-        "game_exit": "खेल समाप्त! फिर मिलेंगे! 👋",
-        "difficulty_prompt": "कठिनाई चुनें",
-        "invalid_difficulty": "अमान्य कठिनाई! उपयोग करें: easy, medium, hard",
-        "difficulty_set": "कठिनाई सेट: {difficulty}",
-        "language_prompt": "एक भाषа चुनें:",
-        "language_set": "भाषा सेट: {language}",
-        "ai_move": "AI ({player}) स्थिति {move} पर चाल चलता है।",
-        "settings_menu": "एक सेटिंग चुनें:",
-        "ai_thinking": "AI सोच रहा है...",
-        "game_mode_prompt": "एक खेल मोड चुनें:",
-        "classic_mode": "क्लासिक खेल",
-        "player_vs_ai": "खिलाड़ी बनाम AI",
-        "ai_vs_player": "AI बनाम खिलाड़ी",
-        "ai_vs_ai": "AI बनाम AI",
-        "tic_tac_toe_web3": "Tic Tac Toe Web3",
-        "choose_symbol": "प्रतीक चुनें (X या O):",
-        "error_message": "त्रुटि! बोर्ड नहीं दिख रहा है? खेल को पुनः आरंभ करें (/restart)।",
-        "invalid_symbol": "अमान्य प्रतीк! उपयोग करें: X या O",
-        "return_to_menu": "मेनू पर लौटें",
-        "main_menu": "मुख्य मेनू",
-        "play_again_or_menu": "क्या आप फिर से खेलना चाहते हैं या मेनू पर लौटना चाहते हैं?",
-        "play_button": "खेलें",
-        "profile_button": "प्रोफ़ाइल",
-        "info_button": "जानकारी",
-        "feature_coming_soon": "फ़ीचर जल्द ही आ रहा है",
-        "game_over_returning": "खेल समाप्त। मेनू पर लौट रहे हैं।",
-        "symbol_assigned": "आपको प्रतीक सौंपा गया है: {symbol}",
-        "game_restarted": "खेल पुनः शुरू हुआ! एक भाषा चुनें:",
-        "human_move": "अपनी चाल",
-        "your_turn": "आपकी बारी",
-    }
-}
 
 def get_text(context: ContextTypes.DEFAULT_TYPE, key: str, **kwargs) -> str:
     lang = context.user_data.get("language", settings["language"])
-    if lang not in translations:
+    texts = i18n.catalog(lang)
+    if texts is None:
         logger.warning(f"Language {lang} not supported, falling back to 'ru'")
         lang = "ru"
         context.user_data["language"] = lang
-    text = translations[lang].get(key, translations["ru"].get(key, key))
-    return text.format(**kwargs if kwargs else {})
+        texts = i18n.catalog(lang)
+    return i18n.render(texts, key, **kwargs)
 
 def save_user_settings(user_id: int, difficulty: str):
     logger.debug(f"Saving settings for user {user_id}: difficulty={difficulty}")
@@ -275,49 +97,34 @@ def save_user_settings(user_id: int, difficulty: str):
     except Exception as e:
         logger.error(f"Failed to save settings for user {user_id}: {e}")
 
-def save_board_state(user_id, board, move_count, context):
+def save_board_state(user_id, board, move_count, context, move=None):
     logger.debug(f"Saving board state for user {user_id}: board={board}, move_count={move_count}")
     try:
-        conn = sqlite3.connect("game.db", timeout=5.0)  # Добавлен тайм-аут
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO game_state 
-            (user_id, board, move_count, game_mode, difficulty, human_player, ai_player, ai1_symbol, ai2_symbol, player1_symbol, player2_symbol)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            json.dumps(board),
-            move_count,
-            context.user_data.get("game_mode"),
-            context.user_data.get("difficulty"),
-            context.user_data.get("human_player"),
-            context.user_data.get("ai_player"),
-            context.user_data.get("ai1_symbol"),
-            context.user_data.get("ai2_symbol"),
-            context.user_data.get("player1_symbol"),
-            context.user_data.get("player2_symbol")
-        ))
-        conn.commit()
+        board_writer.save(user_id, state_row(user_id, board, move_count, context.user_data))
+        record = context.user_data.get("game_record")
+        if move is not None and record is not None:
+            # Ход дописывается в историю партии; у Ultimate символ берём из закодированного состояния
+            symbol = board[move] if isinstance(board, list) else ultimate.decode(board).cell(move)
+            board_writer.record_move(move_row(record["game_id"], move_count, move, symbol))
+            record["moves"] = move_count
     except Exception as e:
         logger.error(f"Failed to save board state for user {user_id}: {e}")
         raise  # Поднимаем исключение для отслеживания
-    finally:
-        conn.close()
 
 def load_board_state(user_id: int) -> tuple | None:
     try:
-        conn = sqlite3.connect("game.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT board, move_count FROM game_state WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
-        if result:
-            board = json.loads(result[0])
-            move_count = result[1]
-            if (isinstance(board, list) and len(board) == 9 and
-                all(c in [" ", "X", "O"] for c in board)):
-                logger.debug(f"Loaded board state for user {user_id}: {board}, move_count: {move_count}")
-                return board, move_count
+        result = board_writer.load(user_id)
+        if result is None:
+            return None
+        # Клетки декодированной доски всегда из " XO", проверяется только размер
+        board, move_count = decode_board(result[0]), result[1]
+        if isinstance(board, str):
+            ultimate.decode(board)  # проверка корректности
+            logger.debug(f"Loaded ultimate state for user {user_id}: {board}, move_count: {move_count}")
+            return board, move_count
+        if nxn_engine.is_supported_board(board) or len(board) == qubic.CELLS:
+            logger.debug(f"Loaded board state for user {user_id}: {board}, move_count: {move_count}")
+            return board, move_count
         return None
     except Exception as e:
         logger.error(f"Failed to load board state for user {user_id}: {e}")
@@ -326,93 +133,204 @@ def load_board_state(user_id: int) -> tuple | None:
 def clear_board_state(user_id):
     logger.debug(f"Clearing board state for user {user_id}")
     try:
-        conn = sqlite3.connect("game.db")
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM game_state WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        board_writer.clear(user_id)
     except Exception as e:
         logger.error(f"Failed to clear board state for user {user_id}: {e}")
 
-def create_board():
-    return [" " for _ in range(9)]
+def begin_game_record(user_id, context):
+    user_data = context.user_data
+    if "game_record" in user_data:
+        # Предыдущая партия не доиграна
+        end_game_record(context, "abandoned")
+    cells = 0 if user_data.get("game_mode") == "ultimate_mode" else len(user_data["board"])
+    try:
+        user_data["game_record"] = new_game_record(storage.next_game_id(), user_id, cells, user_data, int(time.time()))
+    except Exception as e:
+        logger.error(f"Failed to start game record for user {user_id}: {e}")
+
+# Режимы, где один игрок против ИИ: только они попадают в статистику игрока
+VS_AI_MODES = ("player_vs_ai", "ai_vs_player", "ultimate_mode", "qubic_mode")
+
+def end_game_record(context, result: str):
+    record = context.user_data.pop("game_record", None)
+    if record is None:
+        return
+    logger.debug(f"Game {record['game_id']} of user {record['user_id']} finished: {result}, {record['moves']} moves")
+    try:
+        stats = None
+        game_mode, difficulty = unpack_mode(record["mode"])
+        if game_mode in VS_AI_MODES and result != "abandoned":
+            human_player = unpack_symbols(record["symbols"])["human_player"]
+            outcome = "draw" if result == "draw" else "win" if result == human_player else "loss"
+            update_stats(None if outcome == "draw" else "Human" if outcome == "win" else "AI")
+            stats = player_stats.add(record["user_id"], difficulty, outcome)
+        # Итог партии и счётчики игрока уходят в базу одной пачкой
+        board_writer.record_game(game_row(record, result, int(time.time())), stats)
+    except Exception as e:
+        logger.error(f"Failed to record game {record['game_id']}: {e}")
+
+def reset_user_data(context):
+    # Партия, которую сбрасывают вместе с данными пользователя, записывается как брошенная
+    end_game_record(context, "abandoned")
+    context.user_data.clear()
+
+def format_profile(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> str:
+    stats = player_stats.get(user_id)
+    if not any(sum(counts) for counts in stats.values()):
+        return get_text(context, "profile_empty")
+    lines = [get_text(context, "profile_title")]
+    for difficulty in DIFFICULTIES:
+        counts = stats.get(difficulty_code(difficulty))
+        if counts:
+            wins, losses, draws = counts
+            lines.append(get_text(context, "profile_row", level=get_text(context, f"{difficulty}_button"),
+                                  wins=wins, losses=losses, draws=draws))
+    # В итог входят и счётчики без сложности, перенесённые из старой таблицы
+    wins, losses, draws = (sum(column) for column in zip(*stats.values()))
+    lines.append(get_text(context, "profile_row", level=get_text(context, "profile_total"),
+                          wins=wins, losses=losses, draws=draws))
+    return "\n".join(lines)
+
+# Отрисовка доски зависит только от её содержимого: текст и клавиатура кэшируются
+# по строке клеток ("X O  ..."), готовая клавиатура Telegram неизменяема
+RENDER_CACHE_SIZE = 4096
 
 def format_board(board: list) -> str:
-    display = [board[i] if board[i] in ["X", "O"] else " " for i in range(9)]
-    return (
-        f"{display[0]} | {display[1]} | {display[2]}\n"
-        f"---------\n"
-        f"{display[3]} | {display[4]} | {display[5]}\n"
-        f"---------\n"
-        f"{display[6]} | {display[7]} | {display[8]}"
-    )
+    return _format_board("".join(board))
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _format_board(board: str) -> str:
+    if len(board) == qubic.CELLS:
+        return qubic.render(board)
+    size = nxn_engine.board_size(board)
+    display = [board[i] if board[i] in ["X", "O"] else " " for i in range(len(board))]
+    rows = [" | ".join(display[row * size:(row + 1) * size]) for row in range(size)]
+    return f"\n{'-' * (4 * size - 3)}\n".join(rows)
 
 def create_keyboard(board: list, interactive: bool = True):
+    return _create_keyboard("".join(board), interactive)
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _create_keyboard(board: str, interactive: bool):
     # Заменяем пустые клетки номерами, если interactive=True
     buttons = [
         board[i] if board[i] in ["X", "O"] else str(i+1) if interactive else " "
-        for i in range(9)
+        for i in range(len(board))
     ]
     
-    # Разбиваем на строки по 3 кнопки
-    keyboard = [
-        [buttons[0], buttons[1], buttons[2]],
-        [buttons[3], buttons[4], buttons[5]],
-        [buttons[6], buttons[7], buttons[8]]
-    ]
+    if len(board) == qubic.CELLS:
+        # Куб 4x4x4: слои 1-2 в верхних строках, 3-4 в нижних, по 8 кнопок в строке
+        keyboard = [
+            buttons[layer * 16 + row * 4:layer * 16 + row * 4 + 4] + buttons[(layer + 1) * 16 + row * 4:(layer + 1) * 16 + row * 4 + 4]
+            for layer in (0, 2) for row in range(4)
+        ]
+        return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+    # Разбиваем на строки по size кнопок
+    size = nxn_engine.board_size(board)
+    keyboard = [buttons[row * size:(row + 1) * size] for row in range(size)]
     
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
+def render_cache_stats() -> dict:
+    stats = {}
+    for name, func in (("format_board", _format_board), ("create_keyboard", _create_keyboard)):
+        info = func.cache_info()
+        total = info.hits + info.misses
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize,
+                       "hit_rate": info.hits / total if total else 0.0}
+    return stats
+
+# Кнопки меню: ключ перевода -> действие в handle_message
+MENU_ACTIONS = {
+    "play_button": "play_button",
+    "profile_button": "profile",
+    "info_button": "info",
+    "yes_button": "yes",
+    "no_button": "no",
+}
+GAME_MODE_ACTIONS = {
+    "classic_mode": "classic_mode",
+    "player_vs_ai": "player_vs_ai",
+    "ai_vs_player": "ai_vs_player",
+    "ai_vs_ai": "ai_vs_ai",
+    "ultimate_mode": "ultimate_mode",
+    "qubic_mode": "qubic_mode",
+    "tic_tac_toe_web3": "web3",
+}
+DIFFICULTIES = ("easy", "medium", "hard")
+LANGUAGE_BUTTONS = {
+    "Русский (ru)": "ru",
+    "English (en)": "en",
+    "日本語 (ja)": "ja",
+    "Italiano (it)": "it",
+    "हिन्दी (hi)": "hi",
+}
+
+# Всё, что зависит только от языка: индекс "текст кнопки -> (вид, действие)" и готовые клавиатуры
+Buttons = namedtuple("Buttons", ["index", "main_menu", "game_modes", "difficulties", "play_again"])
+
+LANGUAGE_KEYBOARD = ReplyKeyboardMarkup([[text] for text in LANGUAGE_BUTTONS], resize_keyboard=True, one_time_keyboard=True)
+
+def build_buttons(lang: str) -> Buttons:
+    def label(key):
+        return i18n.text(lang, key)
+    index = {}
+    for key, action in {**MENU_ACTIONS, **GAME_MODE_ACTIONS}.items():
+        index[label(key).lower()] = ("mode", action)
+    for level in DIFFICULTIES:
+        index.setdefault(label(f"{level}_button").lower(), ("difficulty", level))
+    for text, code in LANGUAGE_BUTTONS.items():
+        index.setdefault(text.lower(), ("language", code))
+    return Buttons(
+        index=MappingProxyType(index),
+        main_menu=ReplyKeyboardMarkup(
+            [[label("play_button")], [label("profile_button"), label("info_button")]],
+            resize_keyboard=True,
+            one_time_keyboard=True
+        ),
+        game_modes=ReplyKeyboardMarkup(
+            [[label(key)] for key in GAME_MODE_ACTIONS],
+            resize_keyboard=True,
+            one_time_keyboard=True,
+            input_field_placeholder=label("game_mode_prompt")
+        ),
+        difficulties=ReplyKeyboardMarkup(
+            [[label(f"{level}_button")] for level in DIFFICULTIES],
+            resize_keyboard=True,
+            one_time_keyboard=True
+        ),
+        play_again=ReplyKeyboardMarkup([[label("yes_button"), label("no_button")]], resize_keyboard=True),
+    )
+
+# Собирается при первом обращении к языку; клавиатуры Telegram неизменяемы, их можно отправлять повторно
+_buttons = {}
+
+def buttons_for(lang: str) -> Buttons:
+    buttons = _buttons.get(lang)
+    if buttons is None:
+        if i18n.catalog(lang) is None:
+            return buttons_for("ru")
+        buttons = _buttons[lang] = build_buttons(lang)
+    return buttons
+
+def get_buttons(context: ContextTypes.DEFAULT_TYPE) -> Buttons:
+    return buttons_for(context.user_data.get("language", settings["language"]))
+
 def create_main_menu_keyboard(context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [get_text(context, "play_button")],
-        [get_text(context, "profile_button"), get_text(context, "info_button")]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+    return get_buttons(context).main_menu
 
 def create_language_keyboard():
-    keyboard = [
-        ["Русский (ru)"],
-        ["English (en)"],
-        ["日本語 (ja)"],
-        ["Italiano (it)"],
-        ["हिन्दी (hi)"]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+    return LANGUAGE_KEYBOARD
 
 def create_game_mode_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup:
-    logger.debug("Creating game mode keyboard")
-    keyboard = [
-        [get_text(context, "classic_mode")],
-        [get_text(context, "player_vs_ai")],
-        [get_text(context, "ai_vs_player")],
-        [get_text(context, "ai_vs_ai")],
-        [get_text(context, "tic_tac_toe_web3")]
-    ]
-    logger.debug(f"Game mode keyboard created: {keyboard}")
-    return ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True,
-        one_time_keyboard=True,
-        input_field_placeholder=get_text(context, "game_mode_prompt")
-    )
+    return get_buttons(context).game_modes
 
 def create_difficulty_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup:
-    # Используем переведённые строки из словаря translations
-    lang = context.user_data.get("language", settings["language"])
-    difficulty_translations = {
-        "ru": {"easy": "Легко", "medium": "Средне", "hard": "Сложно"},
-        "en": {"easy": "Easy", "medium": "Medium", "hard": "Hard"},
-        "ja": {"easy": "簡単", "medium": "中級", "hard": "難しい"},
-        "it": {"easy": "Facile", "medium": "Medio", "hard": "Difficile"},
-        "hi": {"easy": "आसान", "medium": "मध्यम", "hard": "कठिन"}
-    }
-    keyboard = [
-        [difficulty_translations[lang].get("easy", "Easy")],
-        [difficulty_translations[lang].get("medium", "Medium")],
-        [difficulty_translations[lang].get("hard", "Hard")]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+    return get_buttons(context).difficulties
+
+def create_play_again_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup:
+    return get_buttons(context).play_again
 
 def create_symbol_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardMarkup:
     keyboard = [["X", "O"]]
@@ -422,123 +340,51 @@ def create_symbol_keyboard(context: ContextTypes.DEFAULT_TYPE) -> ReplyKeyboardM
         one_time_keyboard=True
     )
 
-def check_winner(board: list, player: str) -> bool:
-    wins = [(0,1,2), (3,4,5), (6,7,8), (0,3,6), (1,4,7), (2,5,8), (0,4,8), (2,4,6)]
-    return any(board[a] == board[b] == board[c] == player for a, b, c in wins)
-
-def is_board_full(board: list) -> bool:
-    return " " not in board
-
-def get_available_moves(board: list) -> list:
-    return [i for i, spot in enumerate(board) if spot == " "]
-
 def log_move(board, move_idx, player):
     logger.debug(f"Move logged: player={player}, move_idx={move_idx}, board={board}")
 
-def update_stats(winner: str | None):
-    if winner == "AI":
-        stats["AI"]["wins"] += 1
-        stats["Human"]["losses"] += 1
-    elif winner == "Human":
-        stats["Human"]["wins"] += 1
-        stats["AI"]["losses"] += 1
-    else:
-        stats["AI"]["draws"] += 1
-        stats["Human"]["draws"] += 1
-
-def evaluate_board(board: list) -> int | None:
-    if check_winner(board, "O"):
-        return 1
-    elif check_winner(board, "X"):
-        return -1
-    elif is_board_full(board):
-        return 0
-    return None
-
-def minimax(board: list, depth: int, is_maximizing: bool, player: str, opponent: str, alpha: float=-float("inf"), beta: float=float("inf")) -> float:
-    score = evaluate_board(board)
-    if score is not None:
-        return score
-    if is_maximizing:
-        best_score = -float("inf")
-        for move in get_available_moves(board):
-            board[move] = player
-            score = minimax(board, depth + 1, False, player, opponent, alpha, beta)
-            board[move] = " "
-            best_score = max(best_score, score)
-            alpha = max(alpha, best_score)
-            if beta <= alpha:
-                break
-        return best_score
-    else:
-        best_score = float("inf")
-        for move in get_available_moves(board):
-            board[move] = opponent
-            score = minimax(board, depth + 1, True, player, opponent, alpha, beta)
-            board[move] = " "
-            best_score = min(best_score, score)
-            beta = min(beta, best_score)
-            if beta <= alpha:
-                break
-        return best_score
-
-def ai_move(board, player, difficulty):
-    logger.debug(f"AI move called with board: {board}, player: {player}, difficulty: {difficulty}")
-    available_moves = [i for i in range(9) if board[i] == " "]
-    if not available_moves:
-        logger.error(f"No available moves on board: {board}")
-        return None
-    if difficulty == "hard":
-        if 4 in available_moves:
-            return 4
-        opponent = "O" if player == "X" else "X"
-        best_score = -float("inf")
-        best_move = None
-        for move in available_moves:
-            board[move] = player
-            score = minimax(board, 0, False, player, opponent)
-            board[move] = " "
-            if score > best_score:
-                best_score = score
-                best_move = move
-        return best_move or random.choice(available_moves)
-    elif difficulty == "medium":
-        corners = [0, 2, 6, 8]
-        available_corners = [i for i in corners if i in available_moves]
-        if available_corners:
-            return random.choice(available_corners)
-    return random.choice(available_moves)
-
-def update_memory(board: list, move: int, player: str, outcome: str):
-    board_key = str(tuple(board))
-    memory = ai_memory if player == "O" else human_memory
-    if len(memory) > 1000:
-        oldest_key = next(iter(memory))
-        memory.pop(oldest_key)
-        logger.debug(f"Memory limit reached, removed oldest key: {oldest_key}")
-    if board_key not in memory:
-        memory[board_key] = {"moves": [], "weights": []}
-    if move not in memory[board_key]["moves"]:
-        memory[board_key]["moves"].append(move)
-        weight = 1.0 if outcome == "win" else 0.5 if outcome == "draw" else 0.1
-        memory[board_key]["weights"].append(weight)
-        logger.debug(f"Added new move {move} for board {board_key} with weight {weight}")
-    else:
-        idx = memory[board_key]["moves"].index(move)
-        weight = memory[board_key]["weights"][idx]
-        if outcome == "win":
-            memory[board_key]["weights"][idx] = min(weight + 0.5, 2.0)
-async def try_update_message(message, text: str, reply_markup, context):
-    board_state = str(reply_markup.keyboard) if hasattr(reply_markup, 'keyboard') else str(reply_markup)
-    if context.user_data.get("last_message_text") == text and context.user_data.get("last_board_state") == board_state:
+async def ai_move_async(board, player, difficulty):
+    # 3x3 решается поиском по таблице - это дешевле, чем передача задачи в другой процесс
+    if len(board) == 9:
+        return ai_move(board, player, difficulty)
+    try:
+        return await search_pool.move(board, player, difficulty)
+    except asyncio.TimeoutError:
+        logger.warning(f"Engine timeout, falling back to a shallow search, stats: {search_pool.stats()}")
+        if len(board) == qubic.CELLS:
+            return qubic.best_move(board, player, time_budget=0.05, max_depth=1)
+        return nxn_engine.best_move(board, player, time_budget=0.05, max_depth=1)
+
+async def hint_move_async(board, player):
+    # 3x3 - ответ из таблицы; большие доски ищутся в пуле, чтобы не блокировать цикл событий
+    if len(board) == 9:
+        return best_hint(board, player)
+    return await ai_move_async(board, player, "medium")
+
+_BOARD_DIGITS = str.maketrans(" XO", "012")
+
+def board_code(board) -> int:
+    # Доска как число в троичной системе
+    return int("".join(board).translate(_BOARD_DIGITS), 3)
+
+def message_fingerprint(board, key: str, context: ContextTypes.DEFAULT_TYPE) -> tuple:
+    # Текст и клавиатура сообщения с доской однозначно задаются доской, ключом перевода и языком
+    return len(board), board_code(board), key, context.user_data.get("language", settings["language"])
+
+def is_duplicate_message(context: ContextTypes.DEFAULT_TYPE, fingerprint: tuple) -> bool:
+    if context.user_data.get("last_fingerprint") == fingerprint:
         logger.debug("Skipped duplicate message update")
+        return True
+    return False
+
+async def try_update_message(message, text: str, reply_markup, context, fingerprint: tuple):
+    if is_duplicate_message(context, fingerprint):
         return message
 
-    logger.debug(f"Sending new message with text: {text}, board_state: {board_state}")
+    logger.debug(f"Sending new message with text: {text}, fingerprint: {fingerprint}")
     try:
         new_message = await message.chat.send_message(text=text, reply_markup=reply_markup)
-        context.user_data["last_message_text"] = text
-        context.user_data["last_board_state"] = board_state
+        context.user_data["last_fingerprint"] = fingerprint
         logger.debug(f"New message sent successfully for user {message.chat_id}")
         return new_message
     except Exception as e:
@@ -566,14 +412,14 @@ async def start_game_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, mo
             )
         except Exception as e:
             logger.error(f"Failed to send difficulty prompt for user {user_id}: {e}")
-            user_data.clear()
+            reset_user_data(context)
             await update.message.reply_text(
                 text=get_text(context, "error_message"),
                 reply_markup=create_main_menu_keyboard(context)
             )
     except Exception as e:
         logger.error(f"Error in start_game_mode for user {user_id}: {e}")
-        user_data.clear()
+        reset_user_data(context)
         await update.message.reply_text(
             text=get_text(context, "error_message"),
             reply_markup=create_main_menu_keyboard(context)
@@ -606,8 +452,8 @@ async def start_ai_vs_ai(update: Update, context: ContextTypes.DEFAULT_TYPE, dif
 
         while not check_winner(board, ai1_symbol) and not check_winner(board, ai2_symbol) and not is_board_full(board):
             await asyncio.sleep(2)  # Уменьшено с 7 до 2 секунд
-            ai_move_idx = ai_move(board, ai1_symbol, difficulty)
-            if ai_move_idx is None or ai_move_idx < 0 or ai_move_idx >= 9 or board[ai_move_idx] != " ":
+            ai_move_idx = await ai_move_async(board, ai1_symbol, difficulty)
+            if ai_move_idx is None or ai_move_idx < 0 or ai_move_idx >= len(board) or board[ai_move_idx] != " ":
                 logger.error(f"Invalid AI1 move: {ai_move_idx}, board: {board}")
                 user_data["game_active"] = False
                 await game_message.reply_text(
@@ -621,7 +467,7 @@ async def start_ai_vs_ai(update: Update, context: ContextTypes.DEFAULT_TYPE, dif
             log_move(board, ai_move_idx, ai1_symbol)
             move_count += 1
             user_data["move_count"] = move_count
-            save_board_state(user_id, board, move_count, context)
+            save_board_state(user_id, board, move_count, context, move=ai_move_idx)
             
             if check_winner(board, ai1_symbol) or is_board_full(board):
                 break
@@ -632,8 +478,8 @@ async def start_ai_vs_ai(update: Update, context: ContextTypes.DEFAULT_TYPE, dif
             )
             
             await asyncio.sleep(2)  # Уменьшено с 7 до 2 секунд
-            ai_move_idx = ai_move(board, ai2_symbol, difficulty)
-            if ai_move_idx is None or ai_move_idx < 0 or ai_move_idx >= 9 or board[ai_move_idx] != " ":
+            ai_move_idx = await ai_move_async(board, ai2_symbol, difficulty)
+            if ai_move_idx is None or ai_move_idx < 0 or ai_move_idx >= len(board) or board[ai_move_idx] != " ":
                 logger.error(f"Invalid AI2 move: {ai_move_idx}, board: {board}")
                 user_data["game_active"] = False
                 await game_message.reply_text(
@@ -647,16 +493,14 @@ async def start_ai_vs_ai(update: Update, context: ContextTypes.DEFAULT_TYPE, dif
             log_move(board, ai_move_idx, ai2_symbol)
             move_count += 1
             user_data["move_count"] = move_count
-            save_board_state(user_id, board, move_count, context)
+            save_board_state(user_id, board, move_count, context, move=ai_move_idx)
             
-        result_text = (
-            get_text(context, "player_wins", player=ai1_symbol) if check_winner(board, ai1_symbol)
-            else get_text(context, "player_wins", player=ai2_symbol) if check_winner(board, ai2_symbol)
-            else get_text(context, "draw")
-        )
+        winner = next((symbol for symbol in (ai1_symbol, ai2_symbol) if check_winner(board, symbol)), None)
+        end_game_record(context, winner or "draw")
+        result_text = get_text(context, "player_wins", player=winner) if winner else get_text(context, "draw")
         game_message = await game_message.reply_text(  # Новое сообщение
             text=f"{result_text}\n\n{format_board(board)}\n\n{get_text(context, 'play_again')}",
-            reply_markup=ReplyKeyboardMarkup([[get_text(context, "yes_button"), get_text(context, "no_button")]], resize_keyboard=True)
+            reply_markup=create_play_again_keyboard(context)
         )
         user_data["awaiting_play_again"] = True
         user_data["last_mode"] = "ai_vs_ai"
@@ -701,8 +545,8 @@ async def start_player_vs_ai(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
         if not player_first:
             await asyncio.sleep(1)
-            ai_move_idx = ai_move(board, ai_player, user_data.get("difficulty", settings["difficulty"]))
-            if ai_move_idx is None or ai_move_idx < 0 or ai_move_idx >= 9 or board[ai_move_idx] != " ":
+            ai_move_idx = await ai_move_async(board, ai_player, user_data.get("difficulty", settings["difficulty"]))
+            if ai_move_idx is None or ai_move_idx < 0 or ai_move_idx >= len(board) or board[ai_move_idx] != " ":
                 logger.error(f"Invalid AI move: {ai_move_idx}, board: {board}")
                 user_data["game_active"] = False
                 await update.message.reply_text(
@@ -714,7 +558,7 @@ async def start_player_vs_ai(update: Update, context: ContextTypes.DEFAULT_TYPE,
             board[ai_move_idx] = ai_player
             log_move(board, ai_move_idx, ai_player)
             user_data["move_count"] += 1
-            save_board_state(user_id, board, user_data["move_count"], context)
+            save_board_state(user_id, board, user_data["move_count"], context, move=ai_move_idx)
             await context.bot.edit_message_text(
                 chat_id=update.message.chat_id,
                 message_id=user_data["board_message_id"],
@@ -751,7 +595,7 @@ async def start_classic_game(update: Update, context: ContextTypes.DEFAULT_TYPE)
         current_player = user_data["player1_symbol"] if user_data["move_count"] % 2 == 0 else user_data["player2_symbol"]
         hint_text = ""
         if user_data["hints_enabled"]:
-            hint_move = ai_move(user_data["board"], current_player, "medium")
+            hint_move = await hint_move_async(user_data["board"], current_player)
             if hint_move is not None:
                 hint_text = f"\n{get_text(context, 'hint_text', hint=hint_move + 1)}"
         board_message = await update.message.reply_text(
@@ -768,6 +612,132 @@ async def start_classic_game(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_markup=create_main_menu_keyboard(context)
         )
 
+def create_ultimate_keyboard(state: ultimate.UltimateState) -> ReplyKeyboardMarkup:
+    legal = set(state.legal_moves())
+    if state.next_sub != ultimate.ANY_SUB:
+        # Ход в конкретной малой доске: показываем только её 3x3
+        cells = [state.next_sub * 9 + i for i in range(9)]
+        rows = [cells[0:3], cells[3:6], cells[6:9]]
+    else:
+        rows = [[ultimate.move_at(row, column) for column in range(9)] for row in range(9)]
+    keyboard = [
+        [ultimate.cell_name(move) if move in legal else state.cell(move).replace(" ", "·") for move in row]
+        for row in rows
+    ]
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+def format_ultimate_status(context: ContextTypes.DEFAULT_TYPE, state: ultimate.UltimateState) -> str:
+    if state.next_sub == ultimate.ANY_SUB:
+        prompt = get_text(context, "ultimate_any_board")
+    else:
+        first, last = state.next_sub * 9, state.next_sub * 9 + 8
+        prompt = get_text(context, "ultimate_next_board", cells=f"{ultimate.cell_name(first)}-{ultimate.cell_name(last)}")
+    return f"{ultimate.render(state)}\n\n{prompt}"
+
+async def ai_ultimate_move(encoded: str, difficulty: str):
+    try:
+        return await search_pool.ultimate_move(encoded, difficulty)
+    except asyncio.TimeoutError:
+        logger.warning(f"Ultimate engine timeout, falling back to a short search, stats: {search_pool.stats()}")
+        return ultimate.ai_move(encoded, "easy", time_budget=0.05)
+
+async def finish_ultimate_game(message, context: ContextTypes.DEFAULT_TYPE, state: ultimate.UltimateState):
+    user_data = context.user_data
+    end_game_record(context, state.winner or "draw")
+    result_text = (
+        get_text(context, "player_wins", player=state.winner) if state.winner
+        else get_text(context, "draw")
+    )
+    await message.reply_text(
+        text=f"{result_text}\n\n{ultimate.render(state)}\n\n{get_text(context, 'play_again')}",
+        reply_markup=create_play_again_keyboard(context)
+    )
+    user_data["awaiting_play_again"] = True
+    user_data["last_mode"] = "ultimate_mode"
+    user_data["game_active"] = False
+    clear_board_state(message.chat_id)
+
+async def play_ultimate_ai_turn(message, context: ContextTypes.DEFAULT_TYPE, state: ultimate.UltimateState) -> bool:
+    # Возвращает False, если игра закончилась или ход ИИ не удался
+    user_data = context.user_data
+    user_id = message.chat_id
+    encoded = ultimate.encode(state)
+    ai_move_idx = await ai_ultimate_move(encoded, user_data.get("difficulty", settings["difficulty"]))
+    if ai_move_idx is None or ai_move_idx not in state.legal_moves():
+        logger.error(f"Invalid ultimate AI move: {ai_move_idx}, state: {encoded}")
+        await send_error_message(message, context)
+        user_data["game_active"] = False
+        clear_board_state(user_id)
+        return False
+    state.apply(ai_move_idx)
+    user_data["move_count"] += 1
+    user_data["ultimate_state"] = ultimate.encode(state)
+    save_board_state(user_id, user_data["ultimate_state"], user_data["move_count"], context, move=ai_move_idx)
+    if state.is_terminal():
+        await finish_ultimate_game(message, context, state)
+        return False
+    return True
+
+async def start_ultimate_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    user_id = update.message.chat.id
+    logger.debug(f"Starting ultimate game for user {user_id}")
+    try:
+        state = ultimate.UltimateState()
+        user_data["ultimate_state"] = ultimate.encode(state)
+        user_data["move_count"] = 0
+        save_board_state(user_id, user_data["ultimate_state"], 0, context)
+        # X ходит первым: если игрок выбрал O, начинает ИИ
+        if user_data["ai_player"] == "X":
+            await update.message.reply_text(text=get_text(context, "ai_thinking"))
+            if not await play_ultimate_ai_turn(update.message, context, state):
+                return
+        await update.message.reply_text(
+            text=f"{get_text(context, 'your_turn')} ({user_data['human_player']})\n\n{format_ultimate_status(context, state)}",
+            reply_markup=create_ultimate_keyboard(state)
+        )
+    except Exception as e:
+        logger.error(f"Error in start_ultimate_game for user {user_id}: {e}")
+        user_data["game_active"] = False
+        clear_board_state(user_id)
+        await send_error_message(update.message, context)
+
+async def handle_ultimate_move(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    user_data = context.user_data
+    message = update.message
+    user_id = message.chat.id
+    try:
+        state = ultimate.decode(user_data["ultimate_state"])
+    except (KeyError, ValueError) as e:
+        logger.error(f"Invalid ultimate state for user {user_id}: {e}")
+        user_data["game_active"] = False
+        clear_board_state(user_id)
+        await send_error_message(message, context)
+        return
+
+    move = ultimate.parse_cell(text)
+    if move is None or move not in state.legal_moves() or state.to_move != user_data.get("human_player"):
+        await message.reply_text(
+            text=f"{get_text(context, 'invalid_move')}\n\n{format_ultimate_status(context, state)}",
+            reply_markup=create_ultimate_keyboard(state)
+        )
+        return
+
+    state.apply(move)
+    user_data["move_count"] += 1
+    user_data["ultimate_state"] = ultimate.encode(state)
+    save_board_state(user_id, user_data["ultimate_state"], user_data["move_count"], context, move=move)
+    if state.is_terminal():
+        await finish_ultimate_game(message, context, state)
+        return
+
+    if not await play_ultimate_ai_turn(message, context, state):
+        return
+    await message.reply_text(
+        text=f"{get_text(context, 'your_turn')} ({user_data['human_player']})\n\n{format_ultimate_status(context, state)}",
+        reply_markup=create_ultimate_keyboard(state)
+    )
+
 async def send_error_message(message, context: ContextTypes.DEFAULT_TYPE):
     logger.error(f"Sending error message to user {message.chat.id}")
     try:
@@ -795,19 +765,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.debug(f"Skipping command: {text}")
         return
 
+    # Один поиск по индексу кнопок языка пользователя
+    kind, action = get_buttons(context).index.get(text, (None, None))
+
     # Обработка выбора языка
     if user_data.get("awaiting_language"):
-        lang_map = {
-            "русский (ru)": "ru",
-            "english (en)": "en",
-            "日本語 (ja)": "ja",
-            "italiano (it)": "it",
-            "हिन्दी (hi)": "hi"
-        }
-        if text in lang_map:
-            user_data["language"] = lang_map[text]
+        if kind == "language":
+            user_data["language"] = action
             user_data["awaiting_language"] = False
-            logger.debug(f"Language set to {lang_map[text]} for user {user_id}")
+            logger.debug(f"Language set to {action} for user {user_id}")
             await message.reply_text(
                 text=get_text(context, "language_set", language=user_data["language"]),
                 reply_markup=create_main_menu_keyboard(context)
@@ -821,32 +787,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-    # Словарь для обработки кнопок (используем переведённые тексты)
-    mode_map = {
-        get_text(context, "play_button").lower(): "play_button",
-        get_text(context, "classic_mode").lower(): "classic_mode",
-        get_text(context, "player_vs_ai").lower(): "player_vs_ai",
-        get_text(context, "ai_vs_player").lower(): "ai_vs_player",
-        get_text(context, "ai_vs_ai").lower(): "ai_vs_ai",
-        get_text(context, "tic_tac_toe_web3").lower(): "web3",
-        get_text(context, "profile_button").lower(): "profile",
-        get_text(context, "info_button").lower(): "info",
-        get_text(context, "yes_button").lower(): "yes",
-        get_text(context, "no_button").lower(): "no"
-    }
-
-    # Словарь для перевода кнопок сложности обратно в "easy", "medium", "hard"
-    difficulty_map = {
-        "ru": {"легко": "easy", "средне": "medium", "сложно": "hard"},
-        "en": {"easy": "easy", "medium": "medium", "hard": "hard"},
-        "ja": {"簡単": "easy", "中級": "medium", "難しい": "hard"},
-        "it": {"facile": "easy", "medio": "medium", "difficile": "hard"},
-        "hi": {"आसान": "easy", "मध्यम": "medium", "कठिन": "hard"}
-    }
-
     # Обработка выбора режима или кнопок
-    if text in mode_map:
-        selected_mode = mode_map[text]
+    if kind == "mode":
+        selected_mode = action
         logger.debug(f"Processing button: {selected_mode}")
 
         if selected_mode == "play_button":
@@ -857,7 +800,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        elif selected_mode in ["classic_mode", "player_vs_ai", "ai_vs_player", "ai_vs_ai"]:
+        elif selected_mode in ["classic_mode", "player_vs_ai", "ai_vs_player", "ai_vs_ai", "ultimate_mode", "qubic_mode"]:
             user_data["awaiting"] = "difficulty"
             user_data["game_mode"] = selected_mode
             await update.message.reply_text(
@@ -867,7 +810,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         elif selected_mode == "web3":
-            user_data.clear()
+            reset_user_data(context)
             user_data["language"] = context.user_data.get("language", settings["language"])
             keyboard = [InlineKeyboardButton("Play Web3", url=f"https://tic-tac-toewithoptimalaitelegrambot-production.up.railway.app/")]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -878,7 +821,20 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             clear_board_state(user_id)
             return
 
-        elif selected_mode in ["profile", "info"]:
+        elif selected_mode == "profile":
+            try:
+                await player_stats.load(user_id)
+                profile_text = format_profile(context, user_id)
+            except Exception as e:
+                logger.error(f"Failed to load profile for user {user_id}: {e}")
+                profile_text = get_text(context, "error_message")
+            await message.reply_text(
+                text=profile_text,
+                reply_markup=create_main_menu_keyboard(context)
+            )
+            return
+
+        elif selected_mode == "info":
             await message.reply_text(
                 text=get_text(context, "feature_coming_soon"),
                 reply_markup=create_main_menu_keyboard(context)
@@ -906,8 +862,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Обработка выбора сложности
     if user_data.get("awaiting") == "difficulty":
-        lang = user_data.get("language", settings["language"])
-        difficulty = difficulty_map[lang].get(text, None)
+        difficulty = action if kind == "difficulty" else None
         if difficulty in ["easy", "medium", "hard"]:
             try:
                 user_data["difficulty"] = difficulty
@@ -916,9 +871,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 logger.debug(f"Difficulty set to {difficulty} for user {user_id}, awaiting symbol")
 
                 # Инициализируем доску и счётчик ходов
-                user_data["board"] = create_board()
+                if user_data.get("game_mode") == "qubic_mode":
+                    user_data["board"] = qubic.create_board()
+                else:
+                    user_data["board"] = create_board(user_data.get("board_size", 3))
                 user_data["move_count"] = 0
                 user_data["game_active"] = True
+                user_data.pop("last_fingerprint", None)
 
                 await message.reply_text(
                     text=get_text(context, "choose_symbol"),
@@ -947,9 +906,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 game_mode = user_data.get("game_mode")
                 logger.debug(f"Symbol {selected_symbol} selected for user {user_id}, game_mode: {game_mode}")
 
-                if game_mode not in ["player_vs_ai", "ai_vs_player", "ai_vs_ai", "classic_mode"]:
+                if game_mode not in ["player_vs_ai", "ai_vs_player", "ai_vs_ai", "classic_mode", "ultimate_mode", "qubic_mode"]:
                     logger.error(f"Invalid game mode: {game_mode} for user {user_id}")
-                    user_data.clear()
+                    reset_user_data(context)
                     await message.reply_text(
                         text=get_text(context, "error_message"),
                         reply_markup=create_main_menu_keyboard(context)
@@ -957,7 +916,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     return
 
                 # Назначаем символы игрокам
-                if game_mode in ["player_vs_ai", "ai_vs_player"]:
+                if game_mode in ["player_vs_ai", "ai_vs_player", "ultimate_mode", "qubic_mode"]:
                     user_data["human_player"] = selected_symbol
                     user_data["ai_player"] = "O" if selected_symbol == "X" else "X"
                 elif game_mode == "ai_vs_ai":
@@ -967,6 +926,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     user_data["player1_symbol"] = selected_symbol
                     user_data["player2_symbol"] = "O" if selected_symbol == "X" else "X"
 
+                if game_mode in VS_AI_MODES:
+                    # Счётчики игрока загружаются до конца партии, где их меняет player_stats.add
+                    try:
+                        await player_stats.load(user_id)
+                    except Exception as e:
+                        logger.error(f"Failed to load stats for user {user_id}: {e}")
+                begin_game_record(user_id, context)
                 save_board_state(user_id, user_data["board"], user_data["move_count"], context)
 
                 await message.reply_text(
@@ -986,10 +952,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await start_ai_vs_ai(update, context, user_data["difficulty"])
                 elif game_mode == "classic_mode":
                     await start_classic_game(update, context)
+                elif game_mode == "ultimate_mode":
+                    await start_ultimate_game(update, context)
+                elif game_mode == "qubic_mode":
+                    # X ходит первым: если игрок выбрал O, начинает ИИ
+                    await start_player_vs_ai(update, context, player_first=selected_symbol == "X")
             except Exception as e:
                 logger.error(f"Failed to start game for user {user_id}, mode: {game_mode}: {e}")
                 user_data["game_active"] = False
-                user_data.clear()
+                reset_user_data(context)
                 await message.reply_text(
                     text=get_text(context, "error_message"),
                     reply_markup=create_main_menu_keyboard(context)
@@ -1002,11 +973,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=create_symbol_keyboard(context)
             )
         return    
-    if user_data.get("game_active") and game_mode in ["player_vs_ai", "ai_vs_player", "classic_mode"]:
+    if user_data.get("game_active") and game_mode == "ultimate_mode":
+        await handle_ultimate_move(update, context, text)
+        return
+
+    if user_data.get("game_active") and game_mode in ["player_vs_ai", "ai_vs_player", "classic_mode", "qubic_mode"]:
         try:
             # Пытаемся преобразовать ввод в число (ход)
-            move = int(text.strip()) - 1  # Переводим в 0-8 индекс
-            if 0 <= move < 9 and board[move] == " ":
+            move = int(text.strip()) - 1  # Переводим в индекс с нуля
+            if 0 <= move < len(board) and board[move] == " ":
                 # Определяем символ текущего игрока
                 if game_mode == "classic_mode":
                     if "player1_symbol" not in user_data or "player2_symbol" not in user_data:
@@ -1026,79 +1001,74 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     logger.error(f"Missing required keys for user {user_id}: {user_data}")
                     raise ValueError("Missing required game data")
                 
-                save_board_state(user_id, board, user_data["move_count"], context)
+                save_board_state(user_id, board, user_data["move_count"], context, move=move)
                 
                 # Проверяем результат после хода
                 if check_winner(board, current_player):
+                    end_game_record(context, current_player)
                     await message.reply_text(
                         text=f"{get_text(context, 'player_wins', player=current_player)}\n\n{format_board(board)}",
-                        reply_markup=ReplyKeyboardMarkup(
-                            [[get_text(context, "yes_button"), get_text(context, "no_button")]],
-                            resize_keyboard=True
-                        )
+                        reply_markup=create_play_again_keyboard(context)
                     )    
                     user_data["game_active"] = False
                     return
                 elif is_board_full(board):
+                    end_game_record(context, "draw")
                     await message.reply_text(
                         text=f"{get_text(context, 'draw')}\n\n{format_board(board)}",
-                        reply_markup=ReplyKeyboardMarkup(
-                            [[get_text(context, "yes_button"), get_text(context, "no_button")]],
-                            resize_keyboard=True
-                        )
+                        reply_markup=create_play_again_keyboard(context)
                     )
                     user_data["game_active"] = False
                     return
                 
                 # Если игра продолжается, обновляем доску
                 reply_markup = create_keyboard(board, True)
-                if "board_message_id" in user_data:
-                    try:
-                        await context.bot.edit_message_text(
-                            chat_id=user_id,
-                            message_id=user_data["board_message_id"],
-                            text=f"{format_board(board)}\n\n{get_text(context, 'your_turn')}",
-                            reply_markup=reply_markup
-                        )
-                    except Exception as e:
-                        logger.warning(f"Failed to edit message for user {user_id}: {e}, sending new one")
-                        board_message = await try_update_message(message, f"{format_board(board)}\n\n{get_text(context, 'your_turn')}", reply_markup, context)
+                fingerprint = message_fingerprint(board, "your_turn", context)
+                if not is_duplicate_message(context, fingerprint):
+                    if "board_message_id" in user_data:
+                        try:
+                            await context.bot.edit_message_text(
+                                chat_id=user_id,
+                                message_id=user_data["board_message_id"],
+                                text=f"{format_board(board)}\n\n{get_text(context, 'your_turn')}",
+                                reply_markup=reply_markup
+                            )
+                            user_data["last_fingerprint"] = fingerprint
+                        except Exception as e:
+                            logger.warning(f"Failed to edit message for user {user_id}: {e}, sending new one")
+                            board_message = await try_update_message(message, f"{format_board(board)}\n\n{get_text(context, 'your_turn')}", reply_markup, context, fingerprint)
+                            if board_message:
+                                user_data["board_message_id"] = board_message.message_id
+                    else:
+                        board_message = await try_update_message(message, f"{format_board(board)}\n\n{get_text(context, 'your_turn')}", reply_markup, context, fingerprint)
                         if board_message:
                             user_data["board_message_id"] = board_message.message_id
-                else:
-                    board_message = await try_update_message(message, f"{format_board(board)}\n\n{get_text(context, 'your_turn')}", reply_markup, context)
-                    if board_message:
-                        user_data["board_message_id"] = board_message.message_id
                 
                 # Если это режим против ИИ, делаем ход ИИ
-                if game_mode in ["player_vs_ai", "ai_vs_player"]:
+                if game_mode in ["player_vs_ai", "ai_vs_player", "qubic_mode"]:
                     await asyncio.sleep(1)  # Небольшая задержка для "раздумий" ИИ
                     ai_player = user_data["ai_player"]
-                    ai_move_idx = ai_move(board, ai_player, user_data.get("difficulty", "medium"))
+                    ai_move_idx = await ai_move_async(board, ai_player, user_data.get("difficulty", "medium"))
                     
-                    if ai_move_idx is not None and 0 <= ai_move_idx < 9 and board[ai_move_idx] == " ":
+                    if ai_move_idx is not None and 0 <= ai_move_idx < len(board) and board[ai_move_idx] == " ":
                         board[ai_move_idx] = ai_player
                         user_data["move_count"] += 1
-                        save_board_state(user_id, board, user_data["move_count"], context)
+                        save_board_state(user_id, board, user_data["move_count"], context, move=ai_move_idx)
                         
                         # Проверяем результат после хода ИИ
                         if check_winner(board, ai_player):
+                            end_game_record(context, ai_player)
                             await message.reply_text(
                                 text=f"{get_text(context, 'player_wins', player=ai_player)}\n\n{format_board(board)}",
-                                reply_markup=ReplyKeyboardMarkup(
-                                    [[get_text(context, "yes_button"), get_text(context, "no_button")]],
-                                    resize_keyboard=True
-                                )
+                                reply_markup=create_play_again_keyboard(context)
                             )
                             user_data["game_active"] = False
                             return
                         elif is_board_full(board):
+                            end_game_record(context, "draw")
                             await message.reply_text(
                                 text=f"{get_text(context, 'draw')}\n\n{format_board(board)}",
-                                reply_markup=ReplyKeyboardMarkup(
-                                    [[get_text(context, "yes_button"), get_text(context, "no_button")]],
-                                    resize_keyboard=True
-                                )
+                                reply_markup=create_play_again_keyboard(context)
                             )
                             user_data["game_active"] = False
                             return
@@ -1131,7 +1101,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_data = context.user_data
     user_id = update.message.chat.id
     logger.debug(f"Start command received from user {user_id}")
-    user_data.clear()
+    reset_user_data(context)
     user_data["awaiting_language"] = True
     await update.message.reply_text(
         text=get_text(context, "welcome_message"),
@@ -1142,7 +1112,7 @@ async def restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_data = context.user_data
     user_id = update.message.chat_id
     logger.debug(f"Restart command received from user {user_id}")
-    user_data.clear()  # Полный сброс состояния
+    reset_user_data(context)  # Полный сброс состояния
     user_data["awaiting_language"] = True  # Установка флага для выбора языка
     clear_board_state(user_id)  # Очистка сохранённого состояния доски
     await update.message.reply_text(
@@ -1160,6 +1130,70 @@ async def set_difficulty(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=create_difficulty_keyboard(context)
     )
 
+async def set_board_size(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    user_id = update.message.chat.id
+    logger.debug(f"Board size command received from user {user_id}, args: {context.args}")
+    sizes = sorted(nxn_engine.WIN_LENGTH)
+    try:
+        size = int(context.args[0])
+    except (IndexError, ValueError):
+        size = None
+    if size not in nxn_engine.WIN_LENGTH:
+        await update.message.reply_text(
+            text=get_text(context, "invalid_board_size", sizes=", ".join(map(str, sizes))),
+            reply_markup=create_main_menu_keyboard(context)
+        )
+        return
+    user_data["board_size"] = size
+    await update.message.reply_text(
+        text=get_text(context, "board_size_set", size=size, length=nxn_engine.WIN_LENGTH[size]),
+        reply_markup=create_main_menu_keyboard(context)
+    )
+
+def current_player_symbol(user_data) -> str:
+    if user_data.get("game_mode") == "classic_mode":
+        return user_data["player1_symbol"] if user_data.get("move_count", 0) % 2 == 0 else user_data["player2_symbol"]
+    return user_data.get("human_player", "X")
+
+def format_analysis(board: list, values: tuple) -> str:
+    # Вместо пустых клеток - ценность хода для стороны на ходу
+    cells = []
+    for i, value in enumerate(values):
+        if value is None:
+            cells.append(f" {board[i]} " if board[i] != " " else " · ")
+        elif value.value > 0:
+            cells.append(f"+{value.distance} ")
+        elif value.value < 0:
+            cells.append(f"-{value.distance} ")
+        else:
+            cells.append(" 0 ")
+    return "\n".join("|".join(cells[row * 3:row * 3 + 3]) for row in range(3))
+
+async def analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    user_id = update.message.chat.id
+    logger.debug(f"Analyze command received from user {user_id}")
+    board = user_data.get("board")
+    values = None
+    if user_data.get("game_active") and isinstance(board, list) and len(board) == 9:
+        player = current_player_symbol(user_data)
+        values = solved_table.move_values(board, player)
+    if not values or not any(values):
+        await update.message.reply_text(
+            text=get_text(context, "analyze_unavailable"),
+            reply_markup=create_main_menu_keyboard(context) if not user_data.get("game_active") else None
+        )
+        return
+    best = solved_table.best_moves(values)
+    await update.message.reply_text(
+        text=(
+            f"{get_text(context, 'analyze_title', player=player)}\n\n{format_analysis(board, values)}\n\n"
+            f"{get_text(context, 'analyze_legend')}\n{get_text(context, 'hint_text', hint=', '.join(str(i + 1) for i in best))}"
+        ),
+        reply_markup=create_keyboard(board, True)
+    )
+
 async def set_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_data = context.user_data
     user_id = update.message.chat.id
@@ -1183,7 +1217,7 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update and update.message:
         user_data = context.user_data
         user_data["game_active"] = False
-        user_data.clear()
+        reset_user_data(context)
         await update.message.reply_text(
             text=get_text(context, "error_message"),
             reply_markup=create_main_menu_keyboard(context)
@@ -1192,7 +1226,7 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.chat_id
-    context.user_data.clear()
+    reset_user_data(context)
     clear_board_state(user_id)
     logger.debug(f"State reset for user {user_id}")
     await update.message.reply_text(
@@ -1221,20 +1255,44 @@ def load_data(filename='board_state.json'):
         print(f"Ошибка при загрузке: {e}")
         return None
 
+async def start_engine(app: Application):
+    search_pool.start()
+    # Номера партий дальше выдаются из памяти, без обращения к базе из цикла событий
+    await asyncio.to_thread(storage.load_game_ids)
+    board_writer.start()
+    # kill -USR1 <pid> пишет гистограммы поиска в лог (SEARCH_STATS=1)
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, search_stats.log_dump)
+
+async def stop_engine(app: Application):
+    logger.info(f"Engine stats: {search_pool.stats()}")
+    logger.info(f"Render cache stats: {render_cache_stats()}")
+    if search_stats.enabled:
+        search_stats.log_dump()
+    search_pool.shutdown()
+    # Всё, что осталось в очереди записи, сбрасывается до закрытия базы
+    await board_writer.stop()
+    storage.close()
+
 def main():
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    bot_token = load_token()
+    # SEARCH_STATS может прийти из .env, который загружает load_token()
+    search_stats.enable(os.getenv("SEARCH_STATS") == "1")
     lock = acquire_lock()
+    for lang, keys in i18n.missing_keys().items():
+        logger.warning(f"Translation {lang} is missing keys: {', '.join(keys)}")
     try:
         # Инициализация базы данных
-        conn = sqlite3.connect("game.db")
-        with open("database.sql", "r") as f:
-            conn.executescript(f.read())
-        conn.close()
+        storage.init_schema()
         
-        app = Application.builder().token(BOT_TOKEN).build()
+        app = Application.builder().token(bot_token).post_init(start_engine).post_shutdown(stop_engine).build()
         app.add_handler(CommandHandler("start", start))
         app.add_handler(CommandHandler("restart", restart))
         app.add_handler(CommandHandler("difficulty", set_difficulty))
         app.add_handler(CommandHandler("language", set_language))
+        app.add_handler(CommandHandler("size", set_board_size))
+        app.add_handler(CommandHandler("analyze", analyze))
         app.add_handler(CommandHandler("settings", settings_command))
         app.add_handler(CommandHandler("reset", reset))
         app.add_handler(MessageHandler(filters.ALL, handle_message))